@@ -13,9 +13,11 @@ import ctypes
 import ctypes.wintypes
 import sys
 from asyncio import to_thread
+from collections import deque
 from dataclasses import dataclass
-from enum import Enum, auto
 from functools import cached_property
+from threading import Lock
+from traceback import print_exc
 
 import inject
 import win32con
@@ -24,9 +26,11 @@ import win32process
 
 from app_close import AppCloseManager
 from color_filter import ColorFilter
-from commented_config import CommentsHolder
 from inversion_rules import InversionRulesController
+from models.win_tracker import AppMode, WinTrackerSettings
 from utils import show_exceptions
+from window_brightness import BrightnessDetector
+from worker_pool import WorkerPool
 
 user32 = ctypes.windll.user32
 ole32 = ctypes.windll.ole32
@@ -202,44 +206,26 @@ def listen_switch_events(callback, close_manager: AppCloseManager):
         ole32.CoUninitialize()
 
 
-class AppMode(Enum):
-    DISABLE = auto()
-    RULES = auto()
-
-
-@dataclass
-class WinTrackerSettings:
-    """
-    Specifies interaction with windows events
-    """
-    _comments_ = CommentsHolder()
-
-    show_events: bool = False
-    _comments_.add("""
-       [{default!r}] Display all window switch events
-    """, locals())
-
-    mode: AppMode = AppMode.RULES
-    _comments_.add(f"""
-        [{{default.name}}] How to process events: {' | '.join(e.name for e in AppMode)}
-        \t{AppMode.DISABLE.name} - Ignore all events
-        \t{AppMode.RULES.name} - Use rules to determine what to do
-    """, locals())
-
-
 class FilterStateController:
     config = inject.attr(WinTrackerSettings)
     rules = inject.attr(InversionRulesController)
     color_filter = inject.attr(ColorFilter)
+    brightness = inject.attr(BrightnessDetector)
+    workers = inject.attr(WorkerPool)
 
     def __init__(self):
-        from collections import deque
         self.last_active_windows = deque(maxlen=10)
         self.last_active_window = None
+        # Switch events processed in order by single worker task,
+        # so hook thread never waits for process lookups
+        self._switches: deque[tuple[int, int]] = deque()
+        self._switches_lock = Lock()
+        self._switches_task_running = False
 
     def setup(self):
         self.rules.on_rules_changed = self.update_filter_state
         self.color_filter.setup()
+        self.brightness.setup()
 
     async def run(self):
         await to_thread(
@@ -258,6 +244,26 @@ class FilterStateController:
         if idObject != 0:
             return
 
+        with self._switches_lock:
+            self._switches.append((hwnd, event))
+            if self._switches_task_running:
+                return
+            self._switches_task_running = True
+        self.workers.submit("window lookup", self._process_switches)
+
+    def _process_switches(self):
+        while True:
+            with self._switches_lock:
+                if not self._switches:
+                    self._switches_task_running = False
+                    return
+                hwnd, event = self._switches.popleft()
+            try:
+                self._process_switch(hwnd, event)
+            except Exception:
+                print_exc()
+
+    def _process_switch(self, hwnd: int, event: int):
         result = get_window_info(hwnd)
         if not result:
             return
@@ -273,12 +279,19 @@ class FilterStateController:
     def update_filter_state(self, winfo: WindowInfo = None):
         if winfo is None:
             winfo = self.last_active_window
+        if winfo is None:
+            return
 
         mode = self.config.mode
 
         if mode == AppMode.RULES:
             color_filter = self.rules.get_filter(winfo)
-            if color_filter is not None:
-                self.color_filter.set_filter(
-                    *color_filter
-                )
+        elif mode == AppMode.BRIGHTNESS:
+            color_filter = self.brightness.get_filter(winfo)
+        else:
+            return
+
+        if color_filter is not None:
+            self.color_filter.set_filter(
+                *color_filter
+            )
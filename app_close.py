@@ -1,44 +1,98 @@
 import asyncio
-import time
+import threading
+from time import perf_counter
+from traceback import print_exc
 from typing import Callable
 
 import inject
 import win32api
 from win32con import WM_QUIT
 
-from main_thread_loop import execute_in_main_thread, MainExecutor
+from main_thread_loop import execute_in_main_thread, get_label, MainExecutor
 
 
 class AppCloseManager:
+    # Whole shutdown never takes longer
+    SHUTDOWN_DEADLINE = 5.0
+    # Exit handler still running after that is left behind
+    EXIT_HANDLER_TIMEOUT = 2.0
+
     def __init__(self):
         self._blocked_threads: list[int] = []
         self._on_exit_routines: list[Callable] = []
+        # Run after exit handlers, e.g. to write pending saves
+        self._flush_routines: list[Callable] = []
+        self._closing = threading.Lock()
+        # Set once main thread stopped app
+        self.closed = threading.Event()
 
     def append_blocked_thread(self):
         self._blocked_threads.append(win32api.GetCurrentThreadId())
 
     def add_exit_handler(self, handler: Callable):
+        """
+        Exit handlers are independent,
+        so they run in parallel
+        """
         self._on_exit_routines.append(handler)
 
-    def _run_exit_handlers(self):
-        for handler in self._on_exit_routines:
-            try:
-                handler()
-            except:
-                pass
+    def add_flush_handler(self, handler: Callable):
+        """
+        Flush handlers run one by one after exit handlers
+        """
+        self._flush_routines.append(handler)
+
+    def _run_exit_handlers(self, deadline: float):
+        threads = [
+            threading.Thread(
+                name=f"Exit handler {get_label(handler)}",
+                target=self._run_handler,
+                args=(handler,),
+                daemon=True
+            )
+            for handler in self._on_exit_routines
+        ]
+        handlers_deadline = min(deadline, perf_counter() + self.EXIT_HANDLER_TIMEOUT)
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(max(0.0, handlers_deadline - perf_counter()))
+            if thread.is_alive():
+                print(f"{thread.name} didn't finish in time, skipped")
+
+        for handler in self._flush_routines:
+            if perf_counter() > deadline:
+                print(f"No time left for flush {get_label(handler)}")
+                continue
+            self._run_handler(handler)
+
+    @staticmethod
+    def _run_handler(handler: Callable):
+        start = perf_counter()
+        try:
+            handler()
+        except Exception:
+            print_exc()
+        print(f"Closed {get_label(handler)} "
+              f"in {(perf_counter() - start) * 1000:.0f} ms")
 
     def setup(self):
         win32api.SetConsoleCtrlHandler(self._process_exit_handler, True)
 
     def _process_exit_handler(self, signal):
         self.close()
-        time.sleep(1)  # Give time for tray to close
+        # Process is killed right after return
+        self.closed.wait(self.SHUTDOWN_DEADLINE)
         return True  # Prevent next handler to run
 
     def close(self):
-        # Runs all exit handlers in current thread
+        # Runs all exit handlers from current thread
         # Then stop app from main thread
-        self._run_exit_handlers()
+        if not self._closing.acquire(blocking=False):
+            return  # Already closing
+        start = perf_counter()
+        self._run_exit_handlers(start + self.SHUTDOWN_DEADLINE)
+        print(f"Exit handlers done in {(perf_counter() - start) * 1000:.0f} ms")
         self._close()
 
     @execute_in_main_thread(0)
@@ -52,3 +106,4 @@ class AppCloseManager:
             task.cancel()
 
         inject.instance(MainExecutor).close()
+        self.closed.set()
@@ -8,11 +8,14 @@ from active_window_checker import FilterStateController
 from app_close import AppCloseManager
 from auto_update import AutoUpdater
 from color_filter import ColorFiltersListController
+from file_tracker import DirectoryWatcher, WriteBehindSaver
 from interaction import InteractionManager
 from inversion_rules import InversionRulesController
 from main_thread_loop import MainExecutor
 from settings import UserSettings, UserSettingsController
 from tray.tray import Tray
+from window_brightness import FrameCapture, GdiFrameCapture
+from worker_pool import WorkerPool
 
 
 class AppStartManager:
@@ -24,24 +27,29 @@ class AppStartManager:
     color_filters_holder = inject.attr(ColorFiltersListController)
     main_executor = inject.attr(MainExecutor)
     close_manager = inject.attr(AppCloseManager)
+    file_saver = inject.attr(WriteBehindSaver)
+    file_watcher = inject.attr(DirectoryWatcher)
+    workers = inject.attr(WorkerPool)
     tray = inject.attr(Tray)
 
     def setup(self):
         os.chdir(APP_DIR)
         self.settings_controller.setup()
+        self.file_watcher.setup()
         self.inversion_rules.setup()
         self.color_filters_holder.setup()
         self.state_controller.setup()
         self.close_manager.setup()
+        self.close_manager.add_flush_handler(self.file_saver.flush)
+        self.close_manager.add_flush_handler(self.workers.shutdown)
         self.interaction_manager.setup()
         self.tray.setup()
 
     async def run(self):
-        self.updater.run_check_loop()
-
         print("I'm async")
         try:
             await asyncio.gather(
+                self.updater.run_check_loop(),
                 self.state_controller.run(),
                 self.tray.run_async(),
                 self.main_executor.run_loop(),
@@ -66,6 +74,7 @@ def configure(binder: inject.Binder):
             )
         )
 
+    binder.bind_to_constructor(FrameCapture, GdiFrameCapture)
     binder.bind_to_provider(IndirectDependency.CARRYON_BEFORE_UPDATE,
                             lambda: inject.instance(AutoUpdater).carryon)
 
@@ -0,0 +1,252 @@
+"""
+Extraction of zip archive while it is downloaded:
+members written as soon as their bytes arrive, archive itself never stored
+"""
+import hashlib
+import os
+import struct
+import zipfile
+import zlib
+from typing import BinaryIO, Callable, Optional
+
+import requests
+
+from delta_update import MANIFEST, get_local_path
+from downloader import Download, DownloadStats
+
+LOCAL_HEADER = b'PK\x03\x04'
+DATA_DESCRIPTOR = b'PK\x07\x08'
+# Local headers followed by central directory, it's not needed
+CENTRAL_DIRECTORY = b'PK\x01\x02'
+END_OF_ARCHIVE = b'PK\x05\x06'
+ZIP64_EXTRA = 0x0001
+ZIP64_LIMIT = 0xFFFFFFFF
+FLAG_ENCRYPTED = 0x01
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+# Optional signature, CRC-32, sizes (8 bytes each for ZIP64)
+MAX_DESCRIPTOR_SIZE = 4 + 4 + 8 + 8
+UNKNOWN_SIZE_STEP = 64 * 1024
+
+
+class StreamError(Exception):
+    pass
+
+
+class _Member:
+    def __init__(self,
+                 name: str,
+                 file: Optional[BinaryIO],
+                 crc: int,
+                 compress_size: Optional[int],
+                 deflated: bool):
+        self.name = name
+        self.file = file
+        self.crc = crc
+        self.compress_size = compress_size  # None when stored after data
+        self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS) if deflated else None
+        self.consumed = 0
+        self.written = 0
+        self.actual_crc = 0
+        self.digest = hashlib.sha256()
+
+    @property
+    def data_finished(self):
+        if self.decompressor is not None and self.compress_size is None:
+            return self.decompressor.eof
+        return self.consumed == self.compress_size
+
+    def output(self, data: bytes):
+        self.actual_crc = zlib.crc32(data, self.actual_crc)
+        self.digest.update(data)
+        self.written += len(data)
+        if self.file is not None:
+            self.file.write(data)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class ZipStreamExtractor:
+    """
+    Sequential zip reader fed by chunks, each member
+    checked by CRC-32 and by SHA-256 from manifest when given
+    """
+
+    def __init__(self, destination: str, manifest: MANIFEST = None):
+        self.destination = destination
+        self.manifest = manifest or dict()
+        self.extracted: list[str] = []
+        self._buffer = bytearray()
+        self._member: Optional[_Member] = None
+        self._done = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        if self._member is not None:
+            self._member.close()
+
+    def reset(self):
+        """
+        Starts from archive beginning, extracted files are overwritten
+        """
+        self.__exit__()
+        self.extracted.clear()
+        self._buffer.clear()
+        self._member = None
+        self._done = False
+
+    def write(self, chunk: bytes):
+        if self._done:
+            return len(chunk)
+        self._buffer += chunk
+        while self._read_data() if self._member else self._read_header():
+            pass
+        return len(chunk)
+
+    def finish(self):
+        if not self._done:
+            raise StreamError("Archive ended before its central directory")
+
+    def _read_header(self) -> bool:
+        buffer = self._buffer
+        if len(buffer) < len(LOCAL_HEADER):
+            return False
+        signature = bytes(buffer[:len(LOCAL_HEADER)])
+        if signature in (CENTRAL_DIRECTORY, END_OF_ARCHIVE):
+            self._done = True
+            buffer.clear()
+            return False
+        if signature != LOCAL_HEADER:
+            raise StreamError("Broken archive: member header expected")
+        if len(buffer) < zipfile.sizeFileHeader:
+            return False
+        header = struct.unpack(zipfile.structFileHeader, buffer[:zipfile.sizeFileHeader])
+        name_end = zipfile.sizeFileHeader + header[zipfile._FH_FILENAME_LENGTH]
+        header_end = name_end + header[zipfile._FH_EXTRA_FIELD_LENGTH]
+        if len(buffer) < header_end:
+            return False
+        flags = header[zipfile._FH_GENERAL_PURPOSE_FLAG_BITS]
+        name = bytes(buffer[zipfile.sizeFileHeader:name_end]).decode(
+            'utf-8' if flags & FLAG_UTF8 else 'cp437'
+        )
+        compress_size = self._get_compress_size(header, bytes(buffer[name_end:header_end]))
+        del buffer[:header_end]
+
+        method = header[zipfile._FH_COMPRESSION_METHOD]
+        if flags & FLAG_ENCRYPTED or method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise StreamError(f"Unsupported compression of {name}")
+        if flags & FLAG_DATA_DESCRIPTOR:
+            if method != zipfile.ZIP_DEFLATED:
+                raise StreamError(f"Size of {name} is unknown")
+            compress_size = None
+
+        path = get_local_path(self.destination, name)
+        file = None
+        if name.endswith('/'):
+            os.makedirs(path, exist_ok=True)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            file = open(path, 'wb')
+        self._member = _Member(name, file, header[zipfile._FH_CRC], compress_size,
+                               method == zipfile.ZIP_DEFLATED)
+        return True
+
+    @staticmethod
+    def _get_compress_size(header: tuple, extra: bytes) -> int:
+        compress_size = header[zipfile._FH_COMPRESSED_SIZE]
+        if compress_size != ZIP64_LIMIT:
+            return compress_size
+        while len(extra) >= 4:
+            kind, length = struct.unpack('<HH', extra[:4])
+            if kind == ZIP64_EXTRA:
+                # Uncompressed size goes first, when it is too big too
+                index = 8 if header[zipfile._FH_UNCOMPRESSED_SIZE] == ZIP64_LIMIT else 0
+                return struct.unpack('<Q', extra[4 + index:12 + index])[0]
+            extra = extra[4 + length:]
+        raise StreamError("Broken archive: ZIP64 sizes are missing")
+
+    def _read_data(self) -> bool:
+        member, buffer = self._member, self._buffer
+        while not member.data_finished:
+            if member.compress_size is None:
+                # Only decompressor knows where data ends, so it gets data by parts
+                data = bytes(buffer[:UNKNOWN_SIZE_STEP])
+            else:
+                data = bytes(buffer[:member.compress_size - member.consumed])
+            if not data:
+                return False
+            if member.decompressor is None:
+                used = len(data)
+                member.output(data)
+            else:
+                member.output(member.decompressor.decompress(data))
+                used = len(data) - len(member.decompressor.unused_data)
+            member.consumed += used
+            del buffer[:used]
+
+        if member.compress_size is None and not self._read_descriptor():
+            return False
+        self._complete(member)
+        return True
+
+    def _read_descriptor(self) -> bool:
+        buffer, member = self._buffer, self._member
+        # Next header always follows, so bytes after short descriptor are there
+        if len(buffer) < MAX_DESCRIPTOR_SIZE:
+            return False
+        offset = len(DATA_DESCRIPTOR) if buffer.startswith(DATA_DESCRIPTOR) else 0
+        member.crc, compress_size = struct.unpack('<LL', buffer[offset:offset + 8])
+        sizes_length = 8 if compress_size == member.consumed & ZIP64_LIMIT else 16
+        del buffer[:offset + 4 + sizes_length]
+        return True
+
+    def _complete(self, member: _Member):
+        member.close()
+        self._member = None
+        if member.actual_crc != member.crc:
+            raise StreamError(f"CRC mismatch: {member.name}")
+        expected = self.manifest.get(member.name)
+        if expected is not None and member.digest.hexdigest() != expected['sha256']:
+            raise StreamError(f"Checksum mismatch: {member.name}")
+        self.extracted.append(member.name)
+
+
+class ExtractingDownload(Download):
+    """
+    Archive extracted to path (directory) as it comes,
+    interrupted download continued only while app is running
+    """
+
+    def __init__(self,
+                 url: str,
+                 path: str,
+                 sha256: str = None,
+                 size: int = None,
+                 on_progress: Callable[[DownloadStats], None] = None,
+                 session: requests.Session = None,
+                 manifest: MANIFEST = None):
+        super().__init__(url, path, sha256, size, on_progress, session)
+        self.extractor = ZipStreamExtractor(path, manifest)
+
+    def _open(self):
+        return self.extractor
+
+    def _resume(self):
+        pass  # Nothing kept between runs
+
+    def _store_source(self):
+        pass
+
+    def _truncate(self, file: ZipStreamExtractor):
+        file.reset()
+
+    def _complete(self):
+        self.extractor.finish()
+
+    def _discard(self):
+        pass  # Update directory cleaned by updater
@@ -1,71 +1,45 @@
+import asyncio
 import os
+from contextlib import suppress
 import shutil
 import sys
-from dataclasses import dataclass
+import zipfile
 from datetime import timedelta
 from pathlib import Path
-from queue import Queue
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
 import inject
 
 from _meta import IndirectDependency, __developer_mode__, APP_DIR
 from app_close import AppCloseManager
-from commented_config import CommentsHolder
+from archive_stream import ExtractingDownload, StreamError
+from backup import BACKUP_SUFFIX, make_snapshot
+from delta_update import MANIFEST, MANIFEST_SUFFIX, load_manifest, update_by_delta
+from downloader import Download, DownloadError, DownloadStats, get_checksum
 from interaction import InteractionManager
-from models.auto_update import ReleaseArchiveInfo, VersionInfo, get_version
+from main_thread_loop import execute_in_main_thread
+from models.auto_update import AutoUpdateSettings, ReleaseArchiveInfo, VersionInfo, get_version
+from worker_pool import WorkerPool
 
 if TYPE_CHECKING:
     from settings import UserSettingsController, UserSettings
 
 
-@dataclass
-class AutoUpdateSettings:
-    _comments_ = CommentsHolder()
-
-    check_for_updates: bool = True
-    _comments_.add("""
-       [{default!r}] Automatically checks for updates once per day
-       (Since program started)
-       Note, that you are still able to check updates manually,
-       Also there is no effect, if program starts from .py file
-    """, locals())
-
-    ask_before_update: bool = True
-    _comments_.add("""
-       [{default!r}] When new release found, ask user confirmation
-       before install it
-    """, locals())
-
-    check_delay: int = 24
-    _comments_.add("""
-       [{default!r} hours] Check for updates with delay specified
-       Starts from last check, restarts when delay value updated
-    """, locals())
-
-    def __post_init__(self):
-        self.check_delay = min(1000, abs(self.check_delay) or 1)
-
-
 class AutoUpdater:
     config = inject.attr(AutoUpdateSettings)
     im = inject.attr(InteractionManager)
     close_manager = inject.attr(AppCloseManager)
 
+    workers = inject.attr(WorkerPool)
+
     def __init__(self):
-        from threading import Thread, Event
         self.delay = self._get_delay(self.config.check_delay)
-        self.response = Queue()
-        self.delay_changed = Event()
+        self.delay_changed: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
         # carry-on baggage is list of filenames
         # moved to new location on update
         self.carryon: list[str] = []
         if not __developer_mode__:
-            self.thread = Thread(
-                name="Update Checker",
-                target=self._run_check_loop,
-                daemon=True
-            )
             self._setup_interrupt()
         self.update_in_progress = False
 
@@ -80,7 +54,8 @@ class AutoUpdater:
 
     def _update_delay(self, delay: int):
         self.delay = self._get_delay(delay)
-        self.delay_changed.set()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self.delay_changed.set)
 
     @staticmethod
     def _get_delay(delay: int):
@@ -88,19 +63,29 @@ class AutoUpdater:
 
     def _move_carryon(self,
                       current_path: Path,
-                      new_path: Path):
+                      new_path: Path,
+                      replace=False):
+        """
+        :param replace: Whether to override files of new_path
+        """
         if not self.carryon:
             return
 
         from shutil import copyfile
-        from os import path
+        from os import path, makedirs
 
         for filename in self.carryon:
             current_file_path = path.join(current_path, filename)
             new_file_path = path.join(new_path, filename)
             if path.exists(current_file_path):
                 if not path.exists(new_file_path):
+                    makedirs(path.dirname(new_file_path), exist_ok=True)
                     copyfile(current_file_path, new_file_path)
+                elif replace:
+                    # Backups made before keep hardlinks of these files
+                    if not path.samefile(current_file_path, new_file_path):
+                        copyfile(current_file_path, new_file_path + ".tmp")
+                        os.replace(new_file_path + ".tmp", new_file_path)
                 else:
                     print(f"Skip {filename}: update contains same file")
             else:
@@ -118,21 +103,28 @@ class AutoUpdater:
             print("Files to copy:", self.carryon)
             input("Press enter to continue update")
 
-    def run_check_loop(self):
+    async def run_check_loop(self):
         if __developer_mode__:
             return
-        self.thread.start()
-        return self.thread
-
-    def _run_check_loop(self):
+        self.delay_changed = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
         while True:
             if self.config.check_for_updates:
-                self.check_for_updates()
+                await self.check_for_updates()
+
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self.delay_changed.wait(), self.delay)
+            self.delay_changed.clear()
 
-            if self.delay_changed.wait(self.delay):
-                self.delay_changed.clear()
+    @execute_in_main_thread()
+    async def check_now(self):
+        await self.check_for_updates()
 
-    def check_for_updates(self):
+    async def check_for_updates(self):
+        """
+        Runs in main thread, so no worker waits for user answer,
+        only network and disk work sent to other threads
+        """
         try:
             if self.update_in_progress:
                 return
@@ -140,10 +132,12 @@ class AutoUpdater:
             import _meta as app
             client_version = get_version(app.__version__)
             print("Current version:", app.__version__)
-            last_version_info = get_latest_version_info(
+            last_version_info = await asyncio.wrap_future(self.workers.submit(
+                "update check",
+                get_latest_version_info,
                 app.__author__,
                 app.__product_name__
-            )
+            ))
 
             if last_version_info.version <= client_version or \
                     not last_version_info.release_info:
@@ -152,20 +146,22 @@ class AutoUpdater:
 
             print("Latest version:", last_version_info.version_text)
 
-            if not self.request_update(last_version_info):
+            if not await self.request_update(last_version_info):
                 print("Update canceled")
                 return
 
-            self.update(last_version_info.release_info)
+            # Download may take minutes, shared workers are not held for so long
+            await asyncio.wrap_future(self.workers.submit_dedicated(
+                "update", self.update, last_version_info.release_info
+            ))
         except Exception as e:
             self.update_in_progress = False
             print("Update failed:", e)
 
-    def request_update(self, version_info: VersionInfo):
+    async def request_update(self, version_info: VersionInfo) -> bool:
         if not self.config.ask_before_update:
             return True
-        self.im.request_update(version_info, self.response)
-        return self.response.get()
+        return await self.im.request_update(version_info)
 
     def update(self, release_info: ReleaseArchiveInfo):
         if self.update_in_progress:
@@ -183,22 +179,25 @@ class AutoUpdater:
         if not check_write_access(parent_path):
             return
 
-        backup_name = app_dir + "_old"
-        backup_path = app_path + "_old"
-
-        rmdir(update_path)
-        os.mkdir(update_path)
-        print("Download latest release:", release_info.download_link)
-        from pretty_downloader import pretty_downloader
-        release_archive_path = pretty_downloader.download(release_info.download_link, update_path, block_size=8192)
-        unpack_once(release_archive_path, update_path)
-        make_backup(app_path, backup_path, backup_name)
-        shutil.move(os.path.join(os.path.realpath(app_path), backup_name + ".zip"), parent_path)
+        backup_name = app_dir + BACKUP_SUFFIX
+        backup_path = app_path + BACKUP_SUFFIX
+
+        reset_dir(update_path)
+        manifest = get_release_manifest(release_info)
+        if not try_delta_update(release_info, manifest, app_path, update_path):
+            reset_dir(update_path)
+            if not extract_release(release_info, manifest, update_path):
+                reset_dir(update_path)
+                # Outside of update directory, so broken download continued next time
+                release_archive_path = os.path.join(parent_path, app_dir + "_update.zip")
+                download_release(release_info, release_archive_path)
+                unpack_once(release_archive_path, update_path)
+        print("Backup:", make_snapshot(app_path, backup_path, self.carryon))
 
         self.on_update_applied(
             Path(update_path),
             Path(app_path),
-            backup_name + ".zip"
+            backup_name
         )
 
         if sys.platform == "win32":
@@ -206,6 +205,38 @@ class AutoUpdater:
         else:
             raise NotImplementedError()
 
+    @staticmethod
+    def has_backup():
+        return os.path.isdir(APP_DIR + BACKUP_SUFFIX)
+
+    @execute_in_main_thread()
+    async def rollback(self):
+        """
+        Replaces app with backup made on last update
+        """
+        if self.update_in_progress or not self.has_backup():
+            return
+        if not await self.im.request_rollback():
+            return
+
+        print("Roll back to previous version")
+        try:
+            await asyncio.wrap_future(self.workers.submit_dedicated(
+                "update", self._apply_rollback
+            ))
+        except Exception as e:
+            print("Rollback failed:", e)
+
+    def _apply_rollback(self):
+        os.chdir(APP_DIR)
+        backup_path = APP_DIR + BACKUP_SUFFIX
+        # Current directory removed, so config changes made since update kept
+        self._move_carryon(Path(APP_DIR), Path(backup_path), replace=True)
+        if sys.platform == "win32":
+            self.complete_update_win32(APP_DIR, backup_path)
+        else:
+            raise NotImplementedError()
+
     def complete_update_win32(self, current_path, new_path):
         update_script_path = "..\\update.bat"
         try_remove_file(update_script_path)
@@ -230,26 +261,106 @@ def get_latest_version_info(user, repo) -> VersionInfo:
         data.get('body', "No description."),
     )
     assets = data.get('assets', [])
+    links = {asset.get("name"): asset.get("browser_download_url") for asset in assets}
     for asset in assets:
         if asset.get("content_type") == "application/zip":
             version_info.release_info = ReleaseArchiveInfo(
                 asset.get("name"),
                 asset.get("size"),
-                asset.get("browser_download_url")
+                asset.get("browser_download_url"),
+                links.get(asset.get("name") + ".sha256"),
+                links.get(asset.get("name") + MANIFEST_SUFFIX),
             )
             break
     return version_info
 
 
-def make_backup(origin_path, backup_path, backup_name):
-    backup_filename = backup_name + ".zip"
-    archive_path = os.path.join(os.path.split(backup_path)[0], backup_filename)
-    rmdir(backup_path)
-    shutil.copytree(origin_path, backup_path)
-    try_remove_file(archive_path)
-    shutil.make_archive(backup_name, "zip", backup_path)
-    shutil.rmtree(backup_path)
-    return archive_path
+def get_release_manifest(release_info: ReleaseArchiveInfo) -> Optional[MANIFEST]:
+    if not release_info.manifest_link:
+        return
+    try:
+        return load_manifest(release_info.manifest_link)
+    except Exception as e:
+        print("Unable to get release manifest:", e)
+
+
+def try_delta_update(release_info: ReleaseArchiveInfo,
+                     manifest: Optional[MANIFEST],
+                     app_path: str,
+                     update_path: str) -> bool:
+    if manifest is None or not release_info.size:
+        return False
+    try:
+        stats = update_by_delta(release_info.download_link, release_info.size,
+                                manifest, app_path, update_path)
+    except Exception as e:
+        print("Delta update failed, whole release will be downloaded:", e)
+        return False
+    if stats is None:
+        print("Too many files changed, whole release will be downloaded")
+        return False
+    print("Delta update:", stats)
+    return True
+
+
+def get_release_checksum(release_info: ReleaseArchiveInfo) -> Optional[str]:
+    if release_info.checksum_link:
+        return get_checksum(release_info.checksum_link)
+    print("No checksum published, downloaded archive can't be verified")
+
+
+def print_progress(stats: DownloadStats):
+    progress = stats.progress
+    print(f"Downloading {'' if progress is None else f'{progress:.0%} '}({stats})")
+
+
+def extract_release(release_info: ReleaseArchiveInfo,
+                    manifest: Optional[MANIFEST],
+                    update_path: str) -> bool:
+    """
+    Extracts archive while it downloaded, so it's never stored
+    :return: False when archive can't be read sequentially
+    """
+    print("Download and extract latest release:", release_info.download_link)
+    download = ExtractingDownload(release_info.download_link, update_path,
+                                  get_release_checksum(release_info),
+                                  release_info.size, print_progress,
+                                  manifest=manifest)
+    try:
+        download.run()
+    except StreamError as e:
+        print("Unable to extract release while downloading:", e)
+        return False
+    print(f"Release extracted: {len(download.extractor.extracted)} files")
+    return True
+
+
+def download_release(release_info: ReleaseArchiveInfo, path: str):
+    print("Download latest release:", release_info.download_link)
+    sha256 = get_release_checksum(release_info)
+    download = Download(release_info.download_link, path, sha256,
+                        release_info.size, print_progress)
+    download.run()
+    if download.stats.resumed_from:
+        print(f"Resumed from {download.stats.resumed_from} bytes")
+    if not sha256:
+        check_archive(path)
+    print("Release downloaded and verified")
+
+
+def check_archive(path: str):
+    """
+    CRC check of all archive members, for archives published
+    without checksum, broken one removed so next try downloads it again
+    """
+    try:
+        with zipfile.ZipFile(path) as archive:
+            broken = archive.testzip()
+    except (zipfile.BadZipFile, OSError) as e:
+        broken = e
+    if broken is not None:
+        try_remove_file(path)
+        raise DownloadError(f"Downloaded archive is broken: {broken}")
 
 
 def unpack_once(filename, extract_dir):
@@ -262,6 +373,11 @@ def rmdir(path):
         shutil.rmtree(path, True)
 
 
+def reset_dir(path):
+    rmdir(path)
+    os.mkdir(path)
+
+
 def check_write_access(path):
     access = os.access(path, os.W_OK)
     if not access:
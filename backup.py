@@ -0,0 +1,79 @@
+"""
+Backup of app directory made before update:
+snapshot directory of hardlinks to current files (copies when links
+are not supported), so it takes no time to compress and no extra space,
+rollback is rename of snapshot back to app directory
+Files app writes in place (e.g. configs) are copied, since
+their links would change along with them
+"""
+import os
+import shutil
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Iterable
+
+from downloader import MiB
+
+BACKUP_SUFFIX = "_old"
+
+
+@dataclass
+class BackupStats:
+    files: int = 0
+    linked: int = 0
+    size: int = 0  # Of all files in backup
+    written: int = 0  # Copied, hardlinks take no space
+    elapsed: float = 0.0
+
+    def __str__(self):
+        return (f"{self.files} files ({self.size / MiB:.1f} MiB), "
+                f"hardlinked {self.linked}, copied {self.files - self.linked} "
+                f"({self.written / MiB:.1f} MiB written) in {self.elapsed:.2f} sec")
+
+
+def make_snapshot(origin_path: str, snapshot_path: str,
+                  copied: Iterable[str] = ()) -> BackupStats:
+    """
+    :param copied: Paths relative to origin, copied instead of linked
+    """
+    started = perf_counter()
+    if os.path.isdir(snapshot_path):
+        shutil.rmtree(snapshot_path)
+    stats = BackupStats()
+    copied = {
+        os.path.normcase(os.path.normpath(os.path.join(origin_path, path)))
+        for path in copied
+    }
+    _link_tree(origin_path, snapshot_path, stats, True, copied)
+    stats.elapsed = perf_counter() - started
+    return stats
+
+
+def _link_tree(source: str, target: str, stats: BackupStats,
+               use_links: bool, copied: set[str]) -> bool:
+    """
+    :return: Whether hardlinks still can be used
+    """
+    os.mkdir(target)
+    with os.scandir(source) as entries:
+        for entry in entries:
+            target_path = os.path.join(target, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                use_links = _link_tree(entry.path, target_path, stats, use_links, copied)
+                continue
+
+            size = entry.stat(follow_symlinks=False).st_size
+            stats.files += 1
+            stats.size += size
+            if use_links and os.path.normcase(os.path.normpath(entry.path)) not in copied:
+                try:
+                    os.link(entry.path, target_path, follow_symlinks=False)
+                    stats.linked += 1
+                    continue
+                except OSError as e:
+                    # Other volume or file system, so further links fail too
+                    print("Unable to hardlink backup files, they will be copied:", e)
+                    use_links = False
+            shutil.copy2(entry.path, target_path, follow_symlinks=False)
+            stats.written += size
+    return use_links
@@ -0,0 +1,118 @@
+"""
+Compares download then unpack of update archive
+with extraction while downloading, from local HTTP server
+Run from app directory: python -m benchmarks.archive_stream
+"""
+import io
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from contextlib import redirect_stdout
+from time import perf_counter
+
+from archive_stream import ExtractingDownload
+from benchmarks.delta_update import make_app, same_trees
+from benchmarks.downloader import ArchiveServer, QuickRetryDownload
+from delta_update import make_manifest
+from downloader import MiB
+
+
+class QuickRetryExtractingDownload(ExtractingDownload):
+    RETRY_DELAY = 0.0
+
+
+class _Unseekable(io.RawIOBase):
+    """
+    Makes zipfile write sizes after data (data descriptors)
+    """
+
+    def __init__(self, file):
+        self.file = file
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.file.write(data)
+
+
+def make_archive(app_path: str, archive_path: str, streamed: bool):
+    with open(archive_path, 'wb') as f:
+        with zipfile.ZipFile(_Unseekable(f) if streamed else f, 'w',
+                             zipfile.ZIP_DEFLATED) as archive:
+            for root, _, files in os.walk(app_path):
+                for name in files:
+                    path = os.path.join(root, name)
+                    archive.write(path, os.path.relpath(path, app_path))
+
+
+def get_tree_size(path: str):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(path)
+        for name in files
+    )
+
+
+def unpack_after_download(server: ArchiveServer, directory: str):
+    archive_path = os.path.join(directory, 'release.zip')
+    target = os.path.join(directory, 'unpacked')
+    download = QuickRetryDownload(server.url, archive_path, size=len(server.content))
+    download.run()
+    shutil.unpack_archive(archive_path, target)
+    peak = os.path.getsize(archive_path) + get_tree_size(target)
+    os.remove(archive_path)
+    return target, peak
+
+
+def extract_while_downloading(server: ArchiveServer, directory: str, manifest):
+    target = os.path.join(directory, 'extracted')
+    os.mkdir(target)
+    download = QuickRetryExtractingDownload(server.url, target, size=len(server.content),
+                                            manifest=manifest)
+    download.run()
+    return target, get_tree_size(target)
+
+
+def main():
+    print(f"{'Case':<28}{'Unpack, s':>11}{'Peak, MiB':>11}"
+          f"{'Stream, s':>11}{'Peak, MiB':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        app_path = os.path.join(directory, 'app')
+        os.mkdir(app_path)
+        make_app(app_path)
+        archive_path = os.path.join(directory, 'archive.zip')
+
+        for case, streamed, drops in (
+            ("Sizes in headers", False, 0),
+            ("Sizes after data", True, 0),
+            ("Dropped connections", False, 3),
+        ):
+            make_archive(app_path, archive_path, streamed)
+            with open(archive_path, 'rb') as f:
+                server = ArchiveServer(f.read())
+            manifest = make_manifest(archive_path)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+            results = []
+            for run in (unpack_after_download,
+                        lambda *args: extract_while_downloading(*args, manifest)):
+                server.drop_after, server.drops_left = 7 * MiB, drops
+                started = perf_counter()
+                with redirect_stdout(io.StringIO()):
+                    target, peak = run(server, directory)
+                results.append((perf_counter() - started, peak))
+                assert same_trees(app_path, target)
+                shutil.rmtree(target)
+
+            (unpack_time, unpack_peak), (stream_time, stream_peak) = results
+            print(f"{case:<28}{unpack_time:>11.2f}{unpack_peak / MiB:>11.1f}"
+                  f"{stream_time:>11.2f}{stream_peak / MiB:>11.1f}")
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Compares zip backup of app directory (used before)
+with hardlink snapshot and with copy snapshot
+Run from app directory: python -m benchmarks.backup
+"""
+import io
+import os
+import shutil
+import tempfile
+from contextlib import redirect_stdout
+from time import perf_counter
+from unittest import mock
+
+import backup
+from benchmarks.archive_stream import get_tree_size
+from benchmarks.delta_update import make_app, same_trees
+from downloader import MiB
+
+
+def zip_backup(app_path: str, backup_path: str):
+    shutil.copytree(app_path, backup_path)
+    shutil.make_archive(backup_path, "zip", backup_path)
+    shutil.rmtree(backup_path)
+    return os.path.getsize(backup_path + ".zip")
+
+
+def main():
+    print(f"{'Backup':<20}{'Time, s':>9}{'Size, MiB':>11}{'Written, MiB':>14}")
+    with tempfile.TemporaryDirectory() as directory:
+        app_path = os.path.join(directory, 'app')
+        os.mkdir(app_path)
+        make_app(app_path)
+        backup_path = app_path + backup.BACKUP_SUFFIX
+
+        started = perf_counter()
+        written = zip_backup(app_path, backup_path)
+        print(f"{'Zip archive':<20}{perf_counter() - started:>9.2f}"
+              f"{written / MiB:>11.1f}{written / MiB:>14.1f}")
+
+        def fail_link(*args, **kwargs):
+            raise OSError("Links are disabled")
+
+        for case, link in (("Hardlink snapshot", os.link),
+                           ("Copy snapshot", fail_link)):
+            with mock.patch('os.link', link), redirect_stdout(io.StringIO()):
+                stats = backup.make_snapshot(app_path, backup_path)
+            assert same_trees(app_path, backup_path)
+            assert stats.size == get_tree_size(app_path)
+            print(f"{case:<20}{stats.elapsed:>9.2f}"
+                  f"{stats.size / MiB:>11.1f}{stats.written / MiB:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
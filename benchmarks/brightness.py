@@ -0,0 +1,45 @@
+"""
+Measures cost of single brightness decision
+Run from app directory: python -m benchmarks.brightness
+"""
+from timeit import repeat
+
+import inject
+
+from window_brightness import (BrightnessDetector, BrightnessSettings,
+                               FrameCapture, SyntheticFrameCapture)
+
+FRAME_SIZES = {
+    'HD': (1280, 720),
+    'FullHD': (1920, 1080),
+    '4K': (3840, 2160),
+}
+BUDGET_MS = 2.0
+
+
+def main(number=200):
+    settings = BrightnessSettings()
+    capture = SyntheticFrameCapture()
+
+    def configure(binder: inject.Binder):
+        binder.bind(BrightnessSettings, settings)
+        binder.bind(FrameCapture, capture)
+
+    inject.clear_and_configure(configure)
+    detector = BrightnessDetector()
+
+    print(f"{'Frame':<8}{'Best, ms':>10}{'Budget, ms':>12}")
+    over_budget = False
+    for name, (width, height) in FRAME_SIZES.items():
+        frame = SyntheticFrameCapture.solid_frame(width, height, 0.9)
+        best = min(repeat(
+            lambda: detector.check_frame(frame),
+            number=number, repeat=5
+        )) / number * 1000
+        over_budget |= best > BUDGET_MS
+        print(f"{name:<8}{best:>10.3f}{BUDGET_MS:>12.1f}")
+    return not over_budget
+
+
+if __name__ == '__main__':
+    raise SystemExit(0 if main() else 1)
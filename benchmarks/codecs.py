@@ -0,0 +1,104 @@
+"""
+Compares generated dataclass codecs with jsons,
+measures validating load of rules files with some rules broken,
+while rules loaded before are in use (reload) and without them (first load)
+Run from app directory: python -m benchmarks.codecs
+"""
+from io import StringIO
+from timeit import repeat
+
+import jsons
+import yaml
+
+import config_validation
+import dataclass_codecs
+from inversion_rules import RULES, InversionRule, LookForTitle, RuleType, RulesSyncer
+
+RULES_COUNTS = (100, 1000, 10000)
+# Parsed YAML of 10k rules checked and converted within it,
+# with regexes of rules compiled before (see try_compile),
+# first load adds compilation of them on top
+VALIDATION_BUDGET_MS = 200
+
+
+def make_rules(count: int) -> RULES:
+    return {
+        f"rule {i}": InversionRule(
+            path=f"C:\\Program Files\\App{i}\\app.exe",
+            title_regex=f"Window {i}.*" if i % 2 else None,
+            look_for_title=LookForTitle.ROOT if i % 2 else None,
+            type=RuleType.EXCLUDE if i % 3 == 0 else None,
+            color_filter_opacity=0.9 if i % 5 == 0 else None,
+        )
+        for i in range(count)
+    }
+
+
+def best_time(func, number=3):
+    return min(repeat(func, number=number, repeat=3)) / number * 1000
+
+
+def compare_with_jsons():
+    dump_kwargs = RulesSyncer.JSON_DUMPER_KWARGS
+    print(f"{'Rules':>8}{'Operation':>11}{'jsons, ms':>12}"
+          f"{'codecs, ms':>12}{'Speedup':>9}")
+    for count in RULES_COUNTS:
+        rules = make_rules(count)
+        raw = jsons.dump(rules, **dump_kwargs)
+        assert dataclass_codecs.dump(rules, **dump_kwargs) == raw
+        assert dataclass_codecs.load(raw, RULES) == jsons.load(raw, RULES)
+
+        for operation, old, new in (
+            ('dump',
+             lambda: jsons.dump(rules, **dump_kwargs),
+             lambda: dataclass_codecs.dump(rules, **dump_kwargs)),
+            ('load',
+             lambda: jsons.load(raw, RULES),
+             lambda: dataclass_codecs.load(raw, RULES)),
+        ):
+            old_time, new_time = best_time(old), best_time(new)
+            print(f"{count:>8}{operation:>11}{old_time:>12.2f}"
+                  f"{new_time:>12.2f}{old_time / new_time:>8.1f}x")
+
+
+def bench_validation():
+    dump_kwargs = RulesSyncer.JSON_DUMPER_KWARGS
+    print(f"{'Rules':>8}{'Broken':>8}{'Parse, ms':>11}{'Validate, ms':>14}"
+          f"{'First load, ms':>16}")
+    for count in RULES_COUNTS:
+        raw = dataclass_codecs.dump(make_rules(count), **dump_kwargs)
+        for i, rule in enumerate(raw.values()):
+            if i % 10 == 0:
+                rule['type'] = 'UNKNOWN'
+        content = yaml.dump(raw, Dumper=yaml.CSafeDumper)
+        node = yaml.compose(content, yaml.CSafeLoader)
+
+        def validate():
+            return config_validation.load_node(
+                node, RULES, config_validation.ValidationReport()
+            )
+
+        report = config_validation.ValidationReport()
+        loaded = config_validation.load(StringIO(content), RULES, report)
+        assert len(loaded) + len(report.quarantine) == count
+        assert len(report.errors) == len(report.quarantine)
+
+        parse_time = best_time(lambda: yaml.compose(content, yaml.CSafeLoader))
+        # Loaded rules kept, like on reload of edited file
+        validate_time = best_time(validate)
+        del loaded
+        first_load_time = best_time(validate)
+        print(f"{count:>8}{len(report.errors):>8}{parse_time:>11.2f}"
+              f"{validate_time:>14.2f}{first_load_time:>16.2f}")
+    print(f"Budget for {count} rules: validate {VALIDATION_BUDGET_MS} ms")
+    return validate_time < VALIDATION_BUDGET_MS
+
+
+def main():
+    compare_with_jsons()
+    print()
+    return bench_validation()
+
+
+if __name__ == '__main__':
+    raise SystemExit(0 if main() else 1)
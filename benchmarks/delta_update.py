@@ -0,0 +1,102 @@
+"""
+Compares delta update with whole archive download and unpack
+on fake app directory served by local HTTP server
+Run from app directory: python -m benchmarks.delta_update
+"""
+import io
+import os
+import random
+import shutil
+import tempfile
+import threading
+import zipfile
+from contextlib import redirect_stdout
+from time import perf_counter
+
+from benchmarks.downloader import ArchiveServer, QuickRetryDownload
+from delta_update import get_file_digest, make_manifest, update_by_delta
+from downloader import MiB
+
+BINARIES = 8  # Files 4 MiB each
+MODULES = 400  # Files 20 KiB each
+CHANGED_COUNTS = (1, 10, 100)
+
+
+def make_app(directory: str):
+    random.seed(1)
+    for i in range(BINARIES):
+        with open(os.path.join(directory, f'lib{i}.dll'), 'wb') as f:
+            f.write(random.randbytes(4 * MiB))
+    os.makedirs(os.path.join(directory, 'lib'))
+    for i in range(MODULES):
+        with open(os.path.join(directory, 'lib', f'module{i}.pyc'), 'wb') as f:
+            # Compressible, like real modules
+            f.write(bytes(random.choices(b'abcdefgh', k=20 * 1024)))
+
+
+def make_release(app_path: str, release_path: str, changed: int, archive_path: str):
+    shutil.copytree(app_path, release_path)
+    for i in range(changed):
+        with open(os.path.join(release_path, 'lib', f'module{i}.pyc'), 'ab') as f:
+            f.write(b'changed')
+    with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for root, _, files in os.walk(release_path):
+            for name in files:
+                path = os.path.join(root, name)
+                archive.write(path, os.path.relpath(path, release_path))
+
+
+def same_trees(first: str, second: str):
+    for root, _, files in os.walk(first):
+        for name in files:
+            path = os.path.join(root, name)
+            other = os.path.join(second, os.path.relpath(path, first))
+            if get_file_digest(path) != get_file_digest(other):
+                return False
+    return True
+
+
+def main():
+    print(f"{'Changed':>8}{'Full, MiB':>11}{'Full, s':>9}"
+          f"{'Delta, MiB':>12}{'Delta, s':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        app_path = os.path.join(directory, 'app')
+        os.mkdir(app_path)
+        make_app(app_path)
+
+        for changed in CHANGED_COUNTS:
+            release_path = os.path.join(directory, 'release')
+            archive_path = os.path.join(directory, 'release.zip')
+            download_path = os.path.join(directory, 'downloaded.zip')
+            make_release(app_path, release_path, changed, archive_path)
+            with open(archive_path, 'rb') as f:
+                content = f.read()
+            server = ArchiveServer(content)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+            full_path = os.path.join(directory, 'full')
+            started = perf_counter()
+            download = QuickRetryDownload(server.url, download_path, size=len(content))
+            with redirect_stdout(io.StringIO()):
+                shutil.unpack_archive(download.run(), full_path)
+            full_time = perf_counter() - started
+
+            delta_path = os.path.join(directory, 'delta')
+            os.mkdir(delta_path)
+            stats = update_by_delta(server.url, len(content),
+                                    make_manifest(archive_path), app_path, delta_path)
+            assert stats is not None and stats.changed == changed
+            assert same_trees(release_path, delta_path)
+            print(f"{changed:>8}{download.stats.transferred / MiB:>11.2f}{full_time:>9.2f}"
+                  f"{stats.transferred / MiB:>12.2f}{stats.elapsed:>10.2f}")
+
+            server.shutdown()
+            server.server_close()
+            for path in (release_path, full_path, delta_path):
+                shutil.rmtree(path)
+            for path in (archive_path, download_path):
+                os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
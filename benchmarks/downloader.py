@@ -0,0 +1,178 @@
+"""
+Measures update downloader against local HTTP server:
+throughput, retries after dropped connections, resume and checksum check,
+parts of other or changed files not continued
+Run from app directory: python -m benchmarks.downloader
+"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from downloader import Download, DownloadError, MiB
+
+ARCHIVE_SIZE = 64 * MiB
+
+
+class ArchiveServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, content: bytes):
+        super().__init__(('127.0.0.1', 0), ArchiveHandler)
+        self.content = content
+        self.etag = f'"{hashlib.sha256(content).hexdigest()[:16]}"'
+        # Path -> content, served besides archive
+        self.files: dict[str, bytes] = dict()
+        self.supports_range = True
+        # Connection closed after that many bytes sent, for that many requests
+        self.drop_after = 0
+        self.drops_left = 0
+        self.requests = 0
+
+    @property
+    def url(self):
+        return self.get_url('release.zip')
+
+    def get_url(self, name: str):
+        return f"http://127.0.0.1:{self.server_port}/{name}"
+
+
+class ArchiveHandler(BaseHTTPRequestHandler):
+    server: ArchiveServer
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        content = server.files.get(self.path.lstrip('/'), server.content)
+        start, end = 0, len(content)
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if if_range is not None and if_range != server.etag:
+            range_header = None  # Changed since part downloaded
+        if range_header and server.supports_range:
+            first, last = range_header.removeprefix('bytes=').split('-')
+            start = int(first)
+            if last:
+                end = min(end, int(last) + 1)
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(content)}')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end - 1}/{len(content)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start))
+        self.send_header('ETag', server.etag)
+        self.end_headers()
+
+        full_end = end
+        if server.drops_left:
+            server.drops_left -= 1
+            end = min(end, start + server.drop_after)
+        view = memoryview(content)
+        for offset in range(start, end, MiB):
+            self.wfile.write(view[offset:min(end, offset + MiB)])
+        if end < full_end:
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+class QuickRetryDownload(Download):
+    RETRY_DELAY = 0.0
+
+
+class FixedChunkDownload(QuickRetryDownload):
+    # Block size used before
+    MIN_CHUNK_SIZE = MAX_CHUNK_SIZE = 8192
+
+
+def run_case(server: ArchiveServer, directory: str, sha256: str,
+             prepare=None, download_class=QuickRetryDownload):
+    path = os.path.join(directory, 'release.zip')
+    download = download_class(server.url, path, sha256, len(server.content))
+    for leftover in (path, download.part_path, download.source_path):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    if prepare is not None:
+        prepare(download)
+    server.requests = 0
+    with redirect_stdout(io.StringIO()):
+        download.run()
+    with open(path, 'rb') as f:
+        assert f.read() == server.content
+    return download.stats
+
+
+def main():
+    content = os.urandom(ARCHIVE_SIZE)
+    sha256 = hashlib.sha256(content).hexdigest()
+    server = ArchiveServer(content)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def write_part(download: Download, data: bytes, url: str, validator: str):
+        with open(download.part_path, 'wb') as f:
+            f.write(data)
+        with open(download.source_path, 'w') as f:
+            json.dump({'url': url, 'validator': validator}, f)
+
+    def write_half(download: Download):
+        write_part(download, content[:ARCHIVE_SIZE // 2], server.url, server.etag)
+
+    def drop_connections(download: Download):
+        server.drop_after, server.drops_left = 5 * MiB, 4
+
+    def no_range(download: Download):
+        write_half(download)
+        server.supports_range = False
+
+    def other_release(download: Download):
+        write_part(download, os.urandom(ARCHIVE_SIZE // 2),
+                   server.get_url('old_release.zip'), server.etag)
+
+    def changed_on_server(download: Download):
+        write_part(download, os.urandom(ARCHIVE_SIZE // 2), server.url, '"old"')
+
+    print(f"{'Case':<24}{'MiB/s':>8}{'Transferred, MiB':>18}"
+          f"{'Resumed, MiB':>14}{'Retries':>9}{'Requests':>10}{'Chunk, KiB':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for case, prepare, download_class in (
+            ("Fixed 8 KiB chunks", None, FixedChunkDownload),
+            ("Clean", None, QuickRetryDownload),
+            ("Resume after restart", write_half, QuickRetryDownload),
+            ("Dropped connections", drop_connections, QuickRetryDownload),
+            ("Server without ranges", no_range, QuickRetryDownload),
+            ("Part of other release", other_release, QuickRetryDownload),
+            ("Changed on server", changed_on_server, QuickRetryDownload),
+        ):
+            stats = run_case(server, directory, sha256, prepare, download_class)
+            server.supports_range = True
+            print(f"{case:<24}{stats.throughput / MiB:>8.1f}"
+                  f"{stats.transferred / MiB:>18.1f}{stats.resumed_from / MiB:>14.1f}"
+                  f"{stats.retries:>9}{server.requests:>10}{stats.chunk_size // 1024:>12}")
+            if prepare is drop_connections:
+                assert stats.retries == 4 and stats.transferred == ARCHIVE_SIZE
+            if prepare in (other_release, changed_on_server):
+                assert stats.resumed_from == 0 and stats.transferred == ARCHIVE_SIZE
+
+        try:
+            run_case(server, directory, '0' * 64)
+        except DownloadError as e:
+            for leftover in ('release.zip.part', 'release.zip.part.source'):
+                assert not os.path.exists(os.path.join(directory, leftover))
+            print("Corrupted archive rejected:", str(e)[:40], "...")
+        else:
+            raise AssertionError("Checksum mismatch not detected")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Floods main thread executor from several threads,
+measures throughput, time in queue by priority
+and lag of other coroutines of main thread.
+Senders yield GIL between bursts of calls, like real ones waiting
+for hooks or I/O, busy threads still delay main thread by themselves,
+so lag is compared with lag caused by same number of threads
+doing plain work for same time, the difference should stay within budget
+Run from app directory: python -m benchmarks.main_executor
+"""
+import asyncio
+import threading
+from time import perf_counter, sleep
+
+import inject
+
+from main_thread_loop import MainExecutor, MainThreadSettings, execute_in_main_thread
+
+THREADS = (1, 4, 16)
+CALLS_PER_THREAD = 20_000
+PRIORITIES = (0, 5, 10)
+DISTINCT_ARGS = 1_000  # Rest of calls repeat pending ones
+BURST = 100  # Calls sent without pause
+LAG_BUDGET_MS = 50.0
+TICK = 0.001
+
+
+def make_functions():
+    functions = []
+    for priority in PRIORITIES:
+        def work(value):
+            return value * 2
+        work.__qualname__ = f"priority {priority}"
+        functions.append(execute_in_main_thread(priority, dedupe=True)(work))
+    return functions
+
+
+class Ticker:
+    """
+    Coroutine of main thread, measures how late it is woken up
+    """
+    def __init__(self):
+        self.lag = 0.0
+
+    async def run(self):
+        while True:
+            start = perf_counter()
+            await asyncio.sleep(TICK)
+            self.lag = max(self.lag, perf_counter() - start - TICK)
+
+
+async def flood(executor: MainExecutor, threads_count: int):
+    functions = make_functions()
+    ticker = Ticker()
+
+    def sender(index: int):
+        for i in range(CALLS_PER_THREAD):
+            func = functions[i % len(functions)]
+            func(i % DISTINCT_ARGS + index * DISTINCT_ARGS)
+            if i % BURST == BURST - 1:
+                sleep(0)
+
+    senders = [
+        threading.Thread(target=sender, args=(i,))
+        for i in range(threads_count)
+    ]
+    ticker_task = asyncio.create_task(ticker.run())
+    loop_task = asyncio.create_task(executor.run_loop())
+    start = perf_counter()
+    for thread in senders:
+        thread.start()
+    for thread in senders:
+        await asyncio.to_thread(thread.join)
+    # Sent from other thread, so queued after everything sent before
+    await asyncio.to_thread(lambda: functions[-1].submit(0).result())
+    wall = perf_counter() - start
+    executor.close()
+    ticker_task.cancel()
+    await asyncio.gather(loop_task, ticker_task, return_exceptions=True)
+    return wall, ticker.lag
+
+
+async def get_gil_lag(threads_count: int, duration: float):
+    ticker = Ticker()
+    stop = threading.Event()
+
+    def busy():
+        value = 0
+        while not stop.is_set():
+            for i in range(DISTINCT_ARGS):
+                value = (value + i) * 2 % DISTINCT_ARGS
+
+    threads = [threading.Thread(target=busy) for _ in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    ticker_task = asyncio.create_task(ticker.run())
+    await asyncio.sleep(duration)
+    stop.set()
+    for thread in threads:
+        await asyncio.to_thread(thread.join)
+    ticker_task.cancel()
+    await asyncio.gather(ticker_task, return_exceptions=True)
+    return ticker.lag
+
+
+def main():
+    print(f"{'Threads':>8}{'Sent':>9}{'Run':>9}{'Dropped':>9}{'Calls/s':>11}"
+          f"{'Lag max, ms':>13}{'GIL lag, ms':>13}  Wait max by priority, ms")
+    over_budget = False
+    for threads_count in THREADS:
+        executor = MainExecutor()
+        inject.clear_and_configure(lambda binder: binder
+                                   .bind(MainExecutor, executor)
+                                   .bind(MainThreadSettings, MainThreadSettings(60.0)))
+        wall, lag = asyncio.run(flood(executor, threads_count))
+        gil_lag = asyncio.run(get_gil_lag(threads_count, wall))
+        sent = threads_count * CALLS_PER_THREAD
+        run = sum(stat.calls for stat in executor.stats.values())
+        waits = ", ".join(
+            f"{label.split()[-1]}: {stat.wait_max * 1000:.1f}"
+            for label, stat in sorted(executor.stats.items())
+        )
+        print(f"{threads_count:>8}{sent:>9}{run:>9}{executor.dropped_calls_total:>9}"
+              f"{sent / wall:>11.0f}{lag * 1000:>13.1f}{gil_lag * 1000:>13.1f}  {waits}")
+        over_budget |= (lag - gil_lag) * 1000 > LAG_BUDGET_MS
+    print(f"Lag budget (over GIL lag): {LAG_BUDGET_MS} ms")
+    return not over_budget
+
+
+if __name__ == '__main__':
+    raise SystemExit(0 if main() else 1)
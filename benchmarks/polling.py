@@ -0,0 +1,56 @@
+"""
+Measures idle cost of polling file watcher backend
+Run from app directory: python -m benchmarks.polling
+"""
+import os
+import tempfile
+from time import perf_counter, process_time
+
+from file_poller import FilePoller, FileWatcherSettings
+from watchdog.events import FileSystemEventHandler
+
+TRACKED_FILES = (3, 30, 300)
+OTHER_FILES = 100  # Untracked files in same directory
+POLLS = 200
+
+
+def measure(tracked_count: int):
+    with tempfile.TemporaryDirectory() as directory:
+        directory = os.path.normcase(directory)
+        tracked = set()
+        for i in range(tracked_count + OTHER_FILES):
+            path = os.path.join(directory, f"file{i}.yaml")
+            with open(path, 'w') as f:
+                f.write("key: value\n")
+            # Idle files were not changed recently
+            os.utime(path, (0, 0))
+            if i < tracked_count:
+                tracked.add(path)
+
+        poller = FilePoller(tracked.__contains__, 0)
+        events = []
+        handler = FileSystemEventHandler()
+        handler.dispatch = events.append
+        poller.schedule(handler, directory)
+
+        wall, cpu = perf_counter(), process_time()
+        for _ in range(POLLS):
+            poller.poll()
+        wall = (perf_counter() - wall) / POLLS
+        cpu = (process_time() - cpu) / POLLS
+        assert not events, "Idle poll must not report changes"
+        return wall, cpu
+
+
+def main():
+    interval = FileWatcherSettings().polling_interval
+    print(f"{'Tracked':>8}{'Poll, ms':>10}{'CPU, ms':>9}"
+          f"{f'Idle CPU at {interval}s':>20}")
+    for count in TRACKED_FILES:
+        wall, cpu = measure(count)
+        print(f"{count:>8}{wall * 1000:>10.3f}{cpu * 1000:>9.3f}"
+              f"{cpu / interval:>19.4%}")
+
+
+if __name__ == '__main__':
+    main()
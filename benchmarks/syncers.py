@@ -0,0 +1,167 @@
+"""
+Measures load and save of config files syncers:
+wall time, peak memory (Python allocations) and bytes written
+No file observer started, so runs on any platform
+Run from app directory: python -m benchmarks.syncers [--quick]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import tracemalloc
+from collections import OrderedDict
+from time import perf_counter
+
+import inject
+import win_magnification as mag  # type: ignore
+import yaml
+
+import dataclass_codecs
+from benchmarks.codecs import make_rules
+from color_filter import ColorFiltersListSyncer
+from commented_config import CommentsHolder, CommentsWriter
+from inversion_rules import RULES, RulesSyncer
+from settings import ConfigSyncer, UserSettings
+
+RULES_COUNTS = (100, 1_000, 10_000, 100_000)
+FILTERS_COUNTS = (10, 100, 1_000)
+HEADER_LINES = (100, 1_000, 10_000)
+
+
+def measure(prepare):
+    """
+    :param prepare: Gives fresh function to measure,
+    called twice, since memory tracing slows down execution
+    """
+    func = prepare()
+    start = perf_counter()
+    func()
+    wall = perf_counter() - start
+
+    func = prepare()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return wall, peak
+
+
+def report(case: str, operation: str, wall: float, peak: int, size: int = None):
+    size = '' if size is None else f"{size / 1024:.1f}"
+    print(f"{case:<28}{operation:<18}{wall * 1000:>11.2f}"
+          f"{peak / 1024 / 1024:>11.2f}{size:>14}")
+
+
+def bench_syncer(case: str, make_syncer, data,
+                 load_kinds=('load',), same=lambda a, b: a == b):
+    syncer = make_syncer(data)
+    wall, peak = measure(lambda: lambda: syncer.write_file(syncer.data))
+    report(case, 'save', wall, peak, os.path.getsize(syncer.filename))
+
+    for kind in load_kinds:
+        readers = []
+
+        def prepare():
+            if kind == 'load (yaml)':
+                os.remove(syncer.snapshot_filename)
+            readers.append(make_syncer(type(data)()))
+            return readers[-1].load_file
+
+        wall, peak = measure(prepare)
+        report(case, kind, wall, peak)
+        assert same(readers[-1].data, data)
+
+
+def bench_rules(directory: str, counts):
+    def make_syncer(data):
+        return RulesSyncer(os.path.join(directory, 'inversion_rules'),
+                           data, RULES)
+
+    for count in counts:
+        bench_syncer(f"Rules x{count}", make_syncer, make_rules(count),
+                     ('load (yaml)', 'load (snapshot)'))
+
+
+def make_filters(count: int):
+    matrices = (
+        mag.const.COLOR_INVERSION_EFFECT,
+        mag.const.COLOR_GRAYSCALE_EFFECT,
+        mag.const.COLOR_SEPIA_EFFECT,
+        mag.const.COLOR_NO_EFFECT,
+    )
+    return OrderedDict(
+        (f"filter {i}", tuple(float(e) for e in matrices[i % len(matrices)]))
+        for i in range(count)
+    )
+
+
+def bench_filters(directory: str, counts):
+    def make_syncer(data):
+        return ColorFiltersListSyncer(os.path.join(directory, 'color_filters'),
+                                      data, OrderedDict[str, list[str]])
+
+    for count in counts:
+        # Matrices stored with limited precision
+        bench_syncer(f"Color filters x{count}", make_syncer, make_filters(count),
+                     same=lambda a, b: a.keys() == b.keys())
+
+
+def bench_settings(directory: str, header_lines):
+    def make_syncer(data):
+        return ConfigSyncer(os.path.join(directory, 'settings'), data)
+
+    bench_syncer("Settings", make_syncer, UserSettings())
+
+    raw = dataclass_codecs.dump(UserSettings(), **ConfigSyncer.JSON_DUMPER_KWARGS)
+    for lines in header_lines:
+        header = "\n".join(f"Header line {i}" for i in range(lines))
+        path = os.path.join(directory, f'header{lines}.yaml')
+
+        def dump_with_header():
+            with open(path, 'w', encoding='utf-8') as f, \
+                    CommentsWriter(header, header).stream_to(f, UserSettings) as output:
+                yaml.dump(raw, output, yaml.CSafeDumper)
+
+        wall, peak = measure(lambda: dump_with_header)
+        report(f"Comments header x{lines}", 'save', wall, peak,
+               os.path.getsize(path))
+
+    # Comments placed after keys all over the file
+    for lines in header_lines:
+        raw = {f"key{i}": i for i in range(lines)}
+        comments = CommentsHolder()
+        comments.content = {key: ("# Comment\n", "# of key\n") for key in raw}
+        path = os.path.join(directory, f'body{lines}.yaml')
+
+        def dump_with_comments():
+            writer = CommentsWriter()
+            yaml.dump(raw, writer.input_stream, yaml.CSafeDumper)
+            with open(path, 'w', encoding='utf-8') as f:
+                writer.dump(f, comments)
+
+        wall, peak = measure(lambda: dump_with_comments)
+        report(f"Comments body x{lines}", 'save', wall, peak,
+               os.path.getsize(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--quick', action='store_true',
+                        help="Skip largest data sets")
+    args = parser.parse_args()
+    limit = -1 if args.quick else None
+    # Syncers get their dependencies (e.g. WriteBehindSaver) created on demand
+    inject.clear_and_configure(lambda binder: None)
+
+    print(f"{'Case':<28}{'Operation':<18}{'Wall, ms':>11}"
+          f"{'Peak, MiB':>11}{'Written, KiB':>14}")
+    with tempfile.TemporaryDirectory() as directory:
+        bench_rules(directory, RULES_COUNTS[:limit])
+        bench_filters(directory, FILTERS_COUNTS)
+        bench_settings(directory, HEADER_LINES[:limit])
+
+    assert threading.active_count() == 1, "No observer threads expected"
+
+
+if __name__ == '__main__':
+    main()
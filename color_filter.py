@@ -4,11 +4,11 @@ from typing import TextIO
 import inject
 import win_magnification as mag  # type: ignore
 
-from app_close import AppCloseManager
 from file_tracker import Syncable, DataFileSyncer
 from main_thread_loop import execute_in_main_thread
 
 COLOR_FILTERS = dict[str, mag.types.ColorMatrix]
+MATRIX_SIZE = 5 * 5
 
 
 class ColorFiltersListSyncer(DataFileSyncer):
@@ -21,30 +21,33 @@ class ColorFiltersListSyncer(DataFileSyncer):
         sort_keys=False,
     )
 
-    def _dump(self, stream: TextIO):
+    def _dump(self, stream: TextIO, data: COLOR_FILTERS):
         new_data = OrderedDict()
-        for key, value in self.data.items():
+        for key, value in data.items():
             new_data[key] = tuple(
                 line+' ' for line in mag.tools.matrix_to_str(value).split('\n')
             )
-        self.data, new_data = new_data, self.data
-        super()._dump(stream)
-        self.data, new_data = new_data, self.data
+        super()._dump(stream, new_data)
 
     def _load(self, stream: TextIO):
         data = super()._load(stream)
         if data is not None:
-            try:
-                for key, value in data.items():
-                    arr = ' '.join(value).split()
-                    data[key] = tuple(
-                        float(e) for e in arr
-                    )
-            except ValueError:
-                return None
+            for key, value in list(data.items()):
+                try:
+                    data[key] = parse_matrix(value)
+                except ValueError as e:
+                    del data[key]
+                    self.validation.reject(key, value, str(e))
         return data
 
 
+def parse_matrix(lines: list[str]) -> tuple[float, ...]:
+    matrix = tuple(float(e) for e in ' '.join(lines).split())
+    if len(matrix) != MATRIX_SIZE:
+        raise ValueError(f"{MATRIX_SIZE} numbers expected, got {len(matrix)}")
+    return matrix
+
+
 class ColorFiltersListController(Syncable):
     """
     List of color filters/effects used
@@ -75,14 +78,14 @@ class ColorFiltersListController(Syncable):
     def add_filter(self, name: str, rule: mag.types.ColorMatrix):
         self.filters[name] = rule
         self.on_filters_changed()
-        self._syncer.save_file()
+        self.save()
 
     def remove_filters(self, names: set[str]):
         if not names:
             return
         for name in names:
             del self.filters[name]
-        self._syncer.save_file()
+        self.save()
         self.on_filters_changed()
 
     def on_filters_changed(self):
@@ -90,14 +93,13 @@ class ColorFiltersListController(Syncable):
 
 
 class ColorFilter:
-    close_manager = inject.attr(AppCloseManager)
     filters_holder = inject.attr(ColorFiltersListController)
 
     def __init__(self):
         self.test_mode = False
         self.api: mag.WinMagnificationAPI = None
 
-    @execute_in_main_thread()
+    @execute_in_main_thread(coalesce="color filter")
     def set_filter(
         self,
         color_filter: str,
@@ -112,12 +114,13 @@ class ColorFilter:
             value,
         )
 
-    @execute_in_main_thread()
+    @execute_in_main_thread(coalesce="color filter opacity")
     def update_opacity(self, value: float):
         self.api.fullscreen.color_effect.transition_power = value
 
     def setup(self):
+        from app_close import AppCloseManager
         self.api = mag.WinMagnificationAPI()
-        self.close_manager.add_exit_handler(
+        inject.instance(AppCloseManager).add_exit_handler(
             self.api.dispose
         )
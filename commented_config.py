@@ -1,5 +1,7 @@
-from dataclasses import Field, MISSING
+from dataclasses import Field, MISSING, fields, is_dataclass
+from functools import lru_cache
 from io import StringIO
+from threading import RLock
 from types import GenericAlias
 from typing import Optional
 
@@ -11,7 +13,7 @@ def get_comments_holder(class_, name='_comments_'):
 
 
 def _get_last_key(source: dict[str]):
-    return tuple(source)[-1]
+    return next(reversed(source))
 
 
 def split_on_comment_lines(text: str):
@@ -35,14 +37,15 @@ def _get_key(line: str):
 
 class _VariableInfo:
     def __init__(self, data: dict[str]):
-        self._data: dict[str] = data
         self.annotations = data.get('__annotations__', {})
-        self.name = self._get_name()
+        self.name = self._get_name(data)
         self.type = self.annotations.get(self.name)
+        # Class namespace keeps changing, so only own value taken
+        self._value = data.get(self.name)
 
-    def _get_name(self):
-        name = _get_last_key(self._data)
-        if not isinstance(self._data[name],
+    def _get_name(self, data: dict[str]):
+        name = _get_last_key(data)
+        if not isinstance(data[name],
                           self.__class__):
             return name
         return _get_last_key(self.annotations)
@@ -59,7 +62,7 @@ class _VariableInfo:
 
     @property
     def default_value(self):
-        value = self._data.get(self.name)
+        value = self._value
         if value is None:
             return
         if not isinstance(value, Field):
@@ -70,9 +73,37 @@ class _VariableInfo:
             return value.default_factory()
 
 
+# Nested holders rendered from inside of outer one
+_render_lock = RLock()
+
+
 class CommentsHolder:
+    """
+    Comments rendered on first access to content,
+    so import of config classes doesn't pay for them
+    """
     def __init__(self):
-        self.content: dict[str] = dict()
+        self._content: Optional[dict[str]] = None
+        self._pending: list[tuple] = []
+
+    @property
+    def content(self) -> dict[str]:
+        if self._content is None:
+            with _render_lock:
+                if self._content is None:
+                    # Published only when complete, other threads
+                    # never see (and cache) part of comments
+                    content = dict()
+                    for args in self._pending:
+                        self._render(content, *args)
+                    self._content = content
+                    self._pending = None
+        return self._content
+
+    @content.setter
+    def content(self, value: dict[str]):
+        self._content = value
+        self._pending = None
 
     def add(self, comment: Optional[str],
             outer_scope_locals: dict[str],
@@ -86,16 +117,28 @@ class CommentsHolder:
         :param include_docstring: Use docstrings of attribute class
         :param inner_comments: Name of inner attribute comments to find
         """
-
         info = _VariableInfo(outer_scope_locals)
+        args = info, comment, include_docstring, inner_comments
+        with _render_lock:
+            if self._content is None:
+                self._pending.append(args)
+            else:
+                self._content = self._render(dict(self._content), *args)
+
+    def _render(self,
+                content: dict[str],
+                info: _VariableInfo,
+                comment: Optional[str],
+                include_docstring: bool,
+                inner_comments: str):
         comment = self._get_comment_text(info, comment,
                                          include_docstring)
         if comment is not None:
-            self.content[info.name] = split_on_comment_lines(comment)
+            content[info.name] = split_on_comment_lines(comment)
         comments = getattr(info.type, inner_comments, None)
-        if not comments:
-            return
-        self.content |= comments.content
+        if comments:
+            content |= comments.content
+        return content
 
     def _get_comment_text(self,
                           info: _VariableInfo,
@@ -116,6 +159,18 @@ class CommentsHolder:
         return text + docstring
 
 
+@lru_cache(maxsize=None)
+def get_comments_text(class_, version: str) -> str:
+    """
+    All comments of class as text block,
+    :param version: App version, docs differ between versions
+    """
+    return "".join(
+        "".join(comments) + "\n"
+        for comments in get_comments_holder(class_).content.values()
+    )
+
+
 class CommentsWriter:
     def __init__(self,
                  top_comment: str = None,
@@ -139,44 +194,122 @@ class CommentsWriter:
         self._stream = None
 
     def dump(self, stream, comments_map: CommentsHolder):
-        lines = self._stream.getvalue().splitlines(True)
-        comments_map = comments_map.content
+        """
+        Writes text of input_stream, comments found by key name
+        """
+        text = self._stream.getvalue()
         self._close_stream()
+        content = comments_map.content
+        with self._open(stream, lambda line: content.get(_get_key(line))) as output:
+            output.write(text)
 
-        i = -1
-        while True:
-            i += 1
-            if i >= len(lines):
-                break
-            line = lines[i]
-
-            if line.lstrip().startswith(COMMENT):
-                continue
-
-            comments = comments_map.get(_get_key(line))
-            if comments is None or not len(comments):
-                continue
-
-            if len(comments) == 1 and self.line_length_limit:
-                new_line = line.rstrip() + "  " + comments[0]
-                if len(new_line) <= self.line_length_limit:
-                    lines[i] = new_line
-                    continue
-
-            i += 1
-            if i < len(lines):
-                comments = list(comments)
-                comments.append("\n")
+    def stream_to(self, stream, class_,
+                  extra_comments: dict[str, tuple[str]] = None) -> 'CommentedStream':
+        """
+        Gives stream to dump YAML of dataclass in,
+        comments written to stream along with it
+        :param extra_comments: Written after comments of field,
+        found by start of line, see get_line_key
+        """
+        comments = get_line_comments(class_)
+        if extra_comments:
+            comments = comments | {
+                key: comments.get(key, ()) + value
+                for key, value in extra_comments.items()
+            }
+
+        def get_comments(line: str):
+            return comments.get(line[:line.find(':') + 1])
+        return self._open(stream, get_comments)
+
+    def _open(self, stream, get_comments):
+        return CommentedStream(stream, get_comments,
+                               self._top_comments,
+                               self._bottom_comments,
+                               self.line_length_limit)
+
+
+class CommentedStream:
+    """
+    Writes each line with its comments once line completed,
+    closing writes rest of text
+    """
+    def __init__(self, stream, get_comments,
+                 top_comments, bottom_comments,
+                 line_length_limit):
+        self._stream = stream
+        self._get_comments = get_comments
+        self._bottom_comments = bottom_comments
+        self._line_length_limit = line_length_limit
+        self._tail = ''
+        # Comments block separated from next line
+        self._separator_pending = False
+        if top_comments:
+            stream.writelines(top_comments)
+            stream.write('\n')
+
+    def write(self, text: str):
+        lines = (self._tail + text).split('\n')
+        self._tail = lines.pop()
+        for line in lines:
+            self._write_line(line + '\n')
+
+    def _write_line(self, line: str):
+        if self._separator_pending:
+            self._stream.write('\n')
+            self._separator_pending = False
+
+        comments = None
+        if not line.lstrip().startswith(COMMENT):
+            comments = self._get_comments(line)
+        if not comments:
+            self._stream.write(line)
+            return
 
-            lines[i:i] = comments
-            i += len(comments) - 1
+        if len(comments) == 1 and self._line_length_limit:
+            new_line = line.rstrip() + "  " + comments[0]
+            if len(new_line) <= self._line_length_limit:
+                self._stream.write(new_line)
+                return
 
-        if self._top_comments:
-            lines[0:0] = self._top_comments
-            lines.insert(len(self._top_comments), '\n')
+        self._stream.write(line)
+        self._stream.writelines(comments)
+        self._separator_pending = True
 
+    def close(self):
+        if self._tail:
+            self._write_line(self._tail)
+            self._tail = ''
         if self._bottom_comments:
-            lines.append('\n')
-            lines += self._bottom_comments
-
-        stream.writelines(lines)
+            self._stream.write('\n')
+            self._stream.writelines(self._bottom_comments)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def get_line_key(path: tuple, indent=2) -> str:
+    """
+    Start of YAML line of nested dataclass field, e.g. '  name:'
+    """
+    return ' ' * indent * (len(path) - 1) + f"{path[-1]}:"
+
+
+@lru_cache(maxsize=None)
+def get_line_comments(class_, indent=2, level=0) -> dict[str, tuple[str]]:
+    """
+    Comments of dataclass fields by start of their YAML line,
+    e.g. '  name:', so nested fields with same name distinguished
+    """
+    comments = get_comments_holder(class_).content
+    result = dict()
+    for field in fields(class_):
+        key = ' ' * indent * level + field.name + ':'
+        if field.name in comments:
+            result[key] = comments[field.name]
+        if is_dataclass(field.type):
+            result |= get_line_comments(field.type, indent, level + 1)
+    return result
@@ -0,0 +1,381 @@
+"""
+Loading of config files with schema check in single pass over parsed YAML:
+values built right from nodes, so each error located by line and column,
+loader of each class built once, like in dataclass_codecs
+Invalid field keeps default value, its source text kept in report,
+invalid item of top level mapping is dropped from result
+and kept raw in quarantine
+Plain scalars of dataclass fields (text, enum names, nulls) converted
+by table made once per field, without generic check of node
+"""
+import dataclasses
+from collections import OrderedDict
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Callable, Optional, TextIO, Union, get_args, get_origin, get_type_hints
+
+import yaml
+from yaml.constructor import ConstructorError, SafeConstructor
+from yaml.nodes import MappingNode, Node, ScalarNode, SequenceNode
+
+import dataclass_codecs
+
+PATH = tuple
+LOADER = Callable[[Node, PATH, 'ValidationReport'], Any]
+
+NULL_TAG = 'tag:yaml.org,2002:null'
+STR_TAG = 'tag:yaml.org,2002:str'
+BOOL_TAG = 'tag:yaml.org,2002:bool'
+FLOAT_TAG = 'tag:yaml.org,2002:float'
+MERGE_TAG = 'tag:yaml.org,2002:merge'
+INVALID = object()
+
+# Scalar constructors keep no state, so shared by all threads
+_constructor = SafeConstructor()
+_SCALARS = SafeConstructor.yaml_constructors
+
+
+@dataclasses.dataclass(frozen=True)
+class ValidationError:
+    line: int
+    column: int
+    path: str
+    message: str
+
+    def __str__(self):
+        return f"{self.line}:{self.column}: {self.path or '<root>'}: {self.message}"
+
+
+class ValidationReport:
+    """
+    Errors found while file loaded and raw items
+    dropped from top level mapping because of them
+    """
+
+    def __init__(self):
+        self.errors: list[ValidationError] = []
+        self.quarantine: dict = dict()
+        # Top level mapping key -> where its value starts
+        self.marks: dict = dict()
+        # Text of file loaded, when known
+        self.source: Optional[str] = None
+        # Path of invalid dataclass field -> its text and error,
+        # replaced by default value
+        self.rejected: dict[PATH, tuple[str, str]] = dict()
+
+    def error(self, node: Node, path: PATH, message: str):
+        mark = node.start_mark
+        self.errors.append(ValidationError(
+            mark.line + 1, mark.column + 1, format_path(path), message
+        ))
+
+    def reject(self, key, raw, message: str):
+        """
+        Moves top level item found invalid after load to quarantine
+        """
+        mark = self.marks[key]
+        self.errors.append(ValidationError(
+            mark.line + 1, mark.column + 1, format_path((key,)), message
+        ))
+        self.quarantine[key] = raw
+
+    def reject_field(self, key_node: Node, value_node: Node, path: PATH):
+        """
+        Keeps source text of field, which value replaced by default
+        """
+        if self.source is None:
+            return
+        start, end = key_node.start_mark, value_node.end_mark
+        lines = self.source[start.index:end.index].rstrip().splitlines()
+        # Relative to field, nested lines keep their indent
+        indent = ' ' * start.column
+        text = "\n".join(
+            [lines[0]] + [line.removeprefix(indent) for line in lines[1:]]
+        )
+        # Error already reported last
+        message = self.errors[-1].message if self.errors else ""
+        self.rejected = {
+            rejected_path: value
+            for rejected_path, value in self.rejected.items()
+            if rejected_path[:len(path)] != path  # Inner fields replaced too
+        }
+        self.rejected[path] = text, message
+
+
+def load(stream: TextIO, cls, report: ValidationReport):
+    """
+    Same as dataclass_codecs.load(yaml.load(stream) or {}, cls),
+    but errors added to report instead of raised
+    :return: None when root value is unusable
+    :raise yaml.YAMLError: when file is not valid YAML
+    """
+    report.source = stream.read()
+    node = yaml.compose(report.source, yaml.CSafeLoader)
+    if node is None:
+        return dataclass_codecs.load({}, cls)
+    return load_node(node, cls, report)
+
+
+def load_node(node: Node, cls, report: ValidationReport):
+    value = _get_loader(cls)(node, (), report)
+    return None if value is INVALID else value
+
+
+def format_path(path: PATH) -> str:
+    parts = []
+    for key in path:
+        if isinstance(key, str) and key.isidentifier():
+            parts.append(f".{key}" if parts else key)
+        else:
+            parts.append(f"[{key!r}]")
+    return "".join(parts)
+
+
+def construct_raw(node: Node):
+    return SafeConstructor().construct_document(node)
+
+
+def describe(node: Node) -> str:
+    if isinstance(node, ScalarNode):
+        return node.tag.rpartition(':')[2]
+    return 'mapping' if isinstance(node, MappingNode) else 'sequence'
+
+
+def _get_pairs(node: MappingNode, path: PATH, report: ValidationReport):
+    pairs = node.value
+    for key_node, _ in pairs:
+        if key_node.tag == MERGE_TAG:
+            try:
+                _constructor.flatten_mapping(node)
+            except ConstructorError as e:
+                report.error(node, path, e.problem)
+                return []
+            return node.value
+    return pairs
+
+
+# Loaders
+
+# Scalar tag -> conversion of node text, which gives INVALID
+# when full check needed (e.g. to report error)
+FAST_PATH = dict[str, Callable[[str], Any]]
+
+
+def _get_fast_path(cls) -> FAST_PATH:
+    if get_origin(cls) is Union:
+        args = [arg for arg in get_args(cls) if arg is not type(None)]
+        if len(args) != 1:
+            return {}
+        return {**_get_fast_path(args[0]), NULL_TAG: lambda text: None}
+    if cls is str:
+        return {STR_TAG: str}
+    if cls is bool:
+        bool_values = SafeConstructor.bool_values
+        return {BOOL_TAG: lambda text: bool_values.get(text.lower(), INVALID)}
+    if cls is float:
+        return {FLOAT_TAG: _to_float}
+    if isinstance(cls, type) and issubclass(cls, Enum):
+        members = cls.__members__
+        return {STR_TAG: lambda text: members.get(text, INVALID)}
+    return {}
+
+
+@lru_cache(maxsize=None)
+def _get_loader(cls) -> LOADER:
+    if cls is Any or cls is None:
+        return _load_raw
+
+    origin = get_origin(cls)
+    if origin is Union:
+        return _get_union_loader(get_args(cls))
+    if origin is not None:
+        return _get_generic_loader(origin, get_args(cls))
+    if dataclasses.is_dataclass(cls):
+        return _get_dataclass_loader(cls)
+    if isinstance(cls, type) and issubclass(cls, Enum):
+        return _get_enum_loader(cls)
+    if cls in dataclass_codecs.PRIMITIVES:
+        return _get_primitive_loader(cls)
+    if cls in (dict, OrderedDict, list, tuple):
+        return _get_generic_loader(cls, ())
+    return _load_raw
+
+
+def _to_float(text: str):
+    try:
+        return float(text)
+    except ValueError:  # E.g. .inf, left for YAML constructor
+        return INVALID
+
+
+def _load_raw(node: Node, path: PATH, report: ValidationReport):
+    return construct_raw(node)
+
+
+def _get_scalar(node: Node, expected: str, path: PATH, report: ValidationReport):
+    if node.__class__ is not ScalarNode:
+        report.error(node, path, f"{expected} expected, got {describe(node)}")
+        return INVALID
+    construct = _SCALARS.get(node.tag)
+    if construct is None:
+        report.error(node, path, f"Unsupported tag {node.tag}")
+        return INVALID
+    try:
+        return construct(_constructor, node)
+    except (ValueError, ConstructorError) as e:
+        report.error(node, path, f"{expected} expected: {e}")
+        return INVALID
+
+
+def _get_primitive_loader(cls):
+    name = cls.__name__
+
+    def load_primitive(node, path, report):
+        value = _get_scalar(node, name, path, report)
+        if value is None or type(value) is cls or value is INVALID:
+            return value
+        # Any text is "true" for bool()
+        if cls is bool and type(value) is str:
+            report.error(node, path, f"{name} expected, got {value!r}")
+            return INVALID
+        try:
+            return cls(value)
+        except (TypeError, ValueError):
+            report.error(node, path, f"{name} expected, got {value!r}")
+            return INVALID
+    return load_primitive
+
+
+def _get_enum_loader(cls: type[Enum]):
+    members = cls.__members__
+    expected = ' | '.join(members)
+
+    def load_enum(node, path, report):
+        value = _get_scalar(node, cls.__name__, path, report)
+        if value is None or value is INVALID:
+            return value
+        member = members.get(value)
+        if member is None:
+            try:
+                member = cls(value)
+            except (TypeError, ValueError):
+                report.error(node, path, f"One of {expected} expected, got {value!r}")
+                return INVALID
+        return member
+    return load_enum
+
+
+def _get_union_loader(args: tuple):
+    # Only Optional[T] used in configs
+    args = [arg for arg in args if arg is not type(None)]
+    if len(args) != 1:
+        return _load_raw
+    inner = _get_loader(args[0])
+
+    def load_optional(node, path, report):
+        if node.tag == NULL_TAG:
+            return None
+        return inner(node, path, report)
+    return load_optional
+
+
+def _get_generic_loader(origin, args: tuple):
+    if origin in (dict, OrderedDict):
+        load_key = _get_loader(args[0] if args else Any)
+        fast_key = _get_fast_path(args[0] if args else Any)
+        load_item = _get_loader(args[1] if len(args) > 1 else Any)
+
+        def load_mapping(node, path, report):
+            if node.__class__ is not MappingNode:
+                report.error(node, path, f"Mapping expected, got {describe(node)}")
+                return INVALID
+            top_level = not path
+            errors = report.errors
+            result = origin()
+            valid = True
+            for key_node, value_node in _get_pairs(node, path, report):
+                convert = fast_key.get(key_node.tag) \
+                    if key_node.__class__ is ScalarNode else None
+                key = INVALID if convert is None else convert(key_node.value)
+                if key is INVALID:
+                    key = load_key(key_node, path, report)
+                if key is INVALID:
+                    valid = top_level and valid
+                    continue
+                if top_level:
+                    report.marks[key] = value_node.start_mark
+                errors_count = len(errors)
+                item = load_item(value_node, (*path, key), report)
+                # Any error inside makes item invalid as whole
+                if len(errors) == errors_count:
+                    result[key] = item
+                elif top_level:
+                    report.quarantine[key] = construct_raw(value_node)
+                else:
+                    # Nested mapping replaced as whole, like sequence
+                    valid = False
+            return result if valid else INVALID
+        return load_mapping
+
+    if origin in (list, tuple, set):
+        load_item = _get_loader(args[0] if args else Any)
+
+        def load_sequence(node, path, report):
+            if node.__class__ is not SequenceNode:
+                report.error(node, path, f"Sequence expected, got {describe(node)}")
+                return INVALID
+            errors = report.errors
+            errors_count = len(errors)
+            items = [
+                load_item(item_node, (*path, i), report)
+                for i, item_node in enumerate(node.value)
+            ]
+            if len(errors) != errors_count:
+                return INVALID
+            return origin(items)
+        return load_sequence
+
+    return _load_raw
+
+
+def _get_dataclass_loader(cls):
+    hints = get_type_hints(cls)
+    fields = [field for field in dataclasses.fields(cls) if field.init]
+    loaders = {
+        field.name: _get_loader(hints.get(field.name, Any))
+        for field in fields
+    }
+    fast_paths = {
+        field.name: _get_fast_path(hints.get(field.name, Any))
+        for field in fields
+    }
+
+    def load_dataclass(node, path, report):
+        if node.__class__ is not MappingNode:
+            report.error(node, path, f"Mapping expected, got {describe(node)}")
+            return INVALID
+        kwargs = {}
+        for key_node, value_node in _get_pairs(node, path, report):
+            name = key_node.value
+            loader = loaders.get(name) if type(name) is str else None
+            if loader is None:
+                continue  # Unknown keys ignored, like in dataclass_codecs
+            if value_node.__class__ is ScalarNode:
+                convert = fast_paths[name].get(value_node.tag)
+                if convert is not None:
+                    value = convert(value_node.value)
+                    if value is not INVALID:
+                        kwargs[name] = value
+                        continue
+            field_path = (*path, name)
+            value = loader(value_node, field_path, report)
+            if value is INVALID:
+                report.reject_field(key_node, value_node, field_path)
+            else:
+                kwargs[name] = value
+        try:
+            return cls(**kwargs)
+        except Exception as e:  # Checks made by class itself
+            report.error(node, path, str(e) or type(e).__name__)
+            return INVALID
+    return load_dataclass
@@ -0,0 +1,206 @@
+"""
+Fast replacement for jsons.load/jsons.dump on config classes,
+code of dict <-> dataclass conversion generated once per class
+instead of reflection made on each call
+"""
+import dataclasses
+from collections import OrderedDict
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Callable, Union, get_args, get_origin, get_type_hints
+
+PRIMITIVES = (str, int, float, bool)
+_MISSING = object()
+
+
+class DecodeError(ValueError):
+    pass
+
+
+def load(data, cls):
+    """
+    Same as jsons.load(data, cls) for types used in configs
+    """
+    try:
+        return _get_loader(cls)(data)
+    except DecodeError:
+        raise
+    except Exception as e:
+        raise DecodeError(f'Could not load "{data!r:.60}" into "{cls}": {e}') from e
+
+
+def dump(obj, strip_nulls=False, strip_privates=False, strip_properties=True):
+    """
+    Same as jsons.dump(obj, ...), properties never dumped
+    """
+    return _dump_value(obj, (strip_nulls, strip_privates))
+
+
+# Loaders
+
+@lru_cache(maxsize=None)
+def _get_loader(cls) -> Callable[[Any], Any]:
+    if cls is Any or cls is None:
+        return _identity
+
+    origin = get_origin(cls)
+    if origin is Union:
+        return _get_union_loader(get_args(cls))
+    if origin is not None:
+        return _get_generic_loader(origin, get_args(cls))
+    if dataclasses.is_dataclass(cls):
+        return _generate_dataclass_loader(cls)
+    if isinstance(cls, type) and issubclass(cls, Enum):
+        return _get_enum_loader(cls)
+    if cls in PRIMITIVES:
+        return _get_primitive_loader(cls)
+    if cls in (dict, OrderedDict, list, tuple):
+        return cls
+    return _identity
+
+
+def _identity(value):
+    return value
+
+
+def _get_primitive_loader(cls):
+    def load_primitive(value):
+        if value is None or type(value) is cls:
+            return value
+        return cls(value)
+    return load_primitive
+
+
+def _get_enum_loader(cls: type[Enum]):
+    members = cls.__members__
+
+    def load_enum(value):
+        if value is None or isinstance(value, cls):
+            return value
+        member = members.get(value)
+        if member is None:
+            member = cls(value)
+        return member
+    return load_enum
+
+
+def _get_union_loader(args: tuple):
+    # Only Optional[T] used in configs
+    args = [arg for arg in args if arg is not type(None)]
+    if len(args) != 1:
+        return _identity
+    inner = _get_loader(args[0])
+
+    def load_optional(value):
+        return None if value is None else inner(value)
+    return load_optional
+
+
+def _get_generic_loader(origin, args: tuple):
+    if origin in (dict, OrderedDict):
+        load_key = _get_loader(args[0] if args else Any)
+        load_item = _get_loader(args[1] if len(args) > 1 else Any)
+
+        def load_mapping(value):
+            if not isinstance(value, dict):
+                raise DecodeError(f"Mapping expected, got {type(value).__name__}")
+            return origin(
+                (load_key(k), load_item(v))
+                for k, v in value.items()
+            )
+        return load_mapping
+
+    if origin in (list, tuple, set):
+        load_item = _get_loader(args[0] if args else Any)
+
+        def load_sequence(value):
+            if not isinstance(value, (list, tuple)):
+                raise DecodeError(f"Sequence expected, got {type(value).__name__}")
+            return origin(load_item(e) for e in value)
+        return load_sequence
+
+    return _identity
+
+
+def _generate_dataclass_loader(cls):
+    hints = get_type_hints(cls)
+    namespace = dict(cls=cls, MISSING=_MISSING, DecodeError=DecodeError)
+    lines = [
+        "def load_dataclass(data):",
+        "    if not isinstance(data, dict):",
+        "        raise DecodeError(f'Mapping expected, got {type(data).__name__}')",
+        "    kwargs = {}",
+    ]
+    for field in dataclasses.fields(cls):
+        if not field.init:
+            continue
+        name = field.name
+        loader = f"load_{name}"
+        namespace[loader] = _get_loader(hints.get(name, Any))
+        lines += [
+            f"    value = data.get({name!r}, MISSING)",
+            "    if value is not MISSING:",
+            f"        kwargs[{name!r}] = {loader}(value)",
+        ]
+    lines.append("    return cls(**kwargs)")
+    return _compile(lines, namespace, "load_dataclass", cls)
+
+
+# Dumpers
+
+def _dump_value(value, options: tuple[bool, bool]):
+    if value is None or type(value) in PRIMITIVES:
+        return value
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, dict):
+        return {
+            _dump_value(k, options): _dump_value(v, options)
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple, set)):
+        return [_dump_value(e, options) for e in value]
+    if dataclasses.is_dataclass(value):
+        return _get_dataclass_dumper(type(value), *options)(value)
+    return value
+
+
+@lru_cache(maxsize=None)
+def _get_dataclass_dumper(cls, strip_nulls: bool, strip_privates: bool):
+    hints = get_type_hints(cls)
+    options = (strip_nulls, strip_privates)
+    namespace = dict(dump_value=lambda value: _dump_value(value, options))
+    lines = [
+        "def dump_dataclass(obj):",
+        "    result = {}",
+    ]
+    for field in dataclasses.fields(cls):
+        name = field.name
+        if strip_privates and name.startswith('_'):
+            continue
+        field_type = hints.get(name, Any)
+        if field_type in PRIMITIVES:
+            expression = "value"
+        elif isinstance(field_type, type) and issubclass(field_type, Enum):
+            expression = "value.name"
+        else:
+            expression = "dump_value(value)"
+
+        lines.append(f"    value = obj.{name}")
+        if strip_nulls:
+            lines += [
+                "    if value is not None:",
+                f"        result[{name!r}] = {expression}",
+            ]
+        else:
+            if expression != "value":
+                expression = f"None if value is None else {expression}"
+            lines.append(f"    result[{name!r}] = {expression}")
+    lines.append("    return result")
+    return _compile(lines, namespace, "dump_dataclass", cls)
+
+
+def _compile(lines: list[str], namespace: dict, name: str, cls):
+    source = "\n".join(lines)
+    exec(compile(source, f"<{name} {cls.__qualname__}>", "exec"), namespace)
+    return namespace[name]
@@ -0,0 +1,266 @@
+"""
+Update by changed files only: release publishes manifest with hashes
+of its archive members, members that differ from installed files
+are read from archive by HTTP Range requests, others copied locally
+Run to make manifest: python delta_update.py release.zip release.zip.manifest.json
+"""
+import hashlib
+import json
+import os
+import shutil
+import struct
+import sys
+import zipfile
+import zlib
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Optional
+
+import requests
+
+from downloader import Download, MiB
+
+MANIFEST_SUFFIX = '.manifest.json'
+# Whole archive downloaded instead, when changes are bigger part of it
+MAX_DELTA_SHARE = 0.5
+# Members closer than that fetched by single request
+MAX_RANGE_GAP = 64 * 1024
+# Usually enough to get central directory by first request
+TAIL_SIZE = 64 * 1024
+MANIFEST = dict[str, dict]  # Member name -> size and sha256
+
+
+class DeltaError(Exception):
+    pass
+
+
+@dataclass
+class DeltaStats:
+    files: int = 0
+    changed: int = 0
+    transferred: int = 0
+    archive_size: int = 0
+    elapsed: float = 0.0
+
+    def __str__(self):
+        return (f"{self.changed} of {self.files} files changed, "
+                f"downloaded {self.transferred / MiB:.2f} of "
+                f"{self.archive_size / MiB:.2f} MiB in {self.elapsed:.2f} sec")
+
+
+@dataclass
+class MemberSpan:
+    info: zipfile.ZipInfo
+    end: int  # Where next member or central directory starts
+
+
+def make_manifest(archive_path: str) -> MANIFEST:
+    files = dict()
+    with zipfile.ZipFile(archive_path) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            digest = hashlib.sha256()
+            with archive.open(info) as f:
+                while chunk := f.read(MiB):
+                    digest.update(chunk)
+            files[info.filename] = dict(size=info.file_size, sha256=digest.hexdigest())
+    return files
+
+
+def get_file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(MiB):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_local_path(directory: str, name: str):
+    parts = name.split('/')
+    if '..' in parts or os.path.isabs(name):
+        raise DeltaError(f"Unsafe member name: {name}")
+    return os.path.join(directory, *parts)
+
+
+def get_changed(manifest: MANIFEST, directory: str) -> set[str]:
+    changed = set()
+    for name, info in manifest.items():
+        path = get_local_path(directory, name)
+        try:
+            # Size differs for most changed files, so no need to hash them
+            if os.path.getsize(path) == info['size'] and \
+                    get_file_digest(path) == info['sha256']:
+                continue
+        except OSError:
+            pass
+        changed.add(name)
+    return changed
+
+
+class _ArchiveTail:
+    """
+    Read-only file of archive size with only its end available,
+    enough for zipfile to read central directory
+    """
+
+    class TooShort(Exception):
+        def __init__(self, needed_offset: int):
+            self.needed_offset = needed_offset
+
+    def __init__(self, data: bytes, size: int):
+        self.data = data
+        self.size = size
+        self.offset = size - len(data)
+        self.position = 0
+
+    def seek(self, position: int, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            position += self.position
+        elif whence == os.SEEK_END:
+            position += self.size
+        self.position = position
+        return position
+
+    def tell(self):
+        return self.position
+
+    def read(self, n=-1):
+        if self.position < self.offset:
+            raise self.TooShort(self.position)
+        start = self.position - self.offset
+        end = len(self.data) if n < 0 else start + n
+        chunk = self.data[start:end]
+        self.position += len(chunk)
+        return chunk
+
+
+class RemoteArchive:
+    """
+    Zip archive on HTTP server, only requested members transferred
+    """
+
+    def __init__(self, url: str, size: int, session: requests.Session = None):
+        self.url = url
+        self.size = size
+        self.session = session or requests.Session()
+        self.transferred = 0
+        self.members: dict[str, MemberSpan] = dict()
+
+    def _get_range(self, start: int, end: int) -> bytes:
+        response = self.session.get(self.url, headers={
+            'Range': f'bytes={start}-{end - 1}',
+            'Accept-Encoding': 'identity',
+        }, timeout=Download.TIMEOUT)
+        response.raise_for_status()
+        data = response.content
+        self.transferred += len(data)
+        if response.status_code != 206 or len(data) != end - start:
+            raise DeltaError("Server can't send part of archive")
+        return data
+
+    def read_directory(self):
+        start = max(0, self.size - TAIL_SIZE)
+        while True:
+            tail = _ArchiveTail(self._get_range(start, self.size), self.size)
+            try:
+                with zipfile.ZipFile(tail) as archive:
+                    infos = sorted(archive.infolist(), key=lambda e: e.header_offset)
+                    directory_start = archive.start_dir
+                break
+            except _ArchiveTail.TooShort as e:
+                start = e.needed_offset
+        ends = [info.header_offset for info in infos[1:]] + [directory_start]
+        self.members = {
+            info.filename: MemberSpan(info, end)
+            for info, end in zip(infos, ends)
+        }
+
+    def get_compressed_size(self, names) -> int:
+        return sum(self.members[name].info.compress_size for name in names)
+
+    def extract(self, names, destination: str, manifest: MANIFEST):
+        for members, start, end in self._group(names):
+            data = self._get_range(start, end)
+            for member in members:
+                content = self._read_member(data, member.info.header_offset - start, member.info)
+                if hashlib.sha256(content).hexdigest() != manifest[member.info.filename]['sha256']:
+                    raise DeltaError(f"Checksum mismatch: {member.info.filename}")
+                path = get_local_path(destination, member.info.filename)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(content)
+
+    def _group(self, names):
+        """
+        Spans of near members joined, so they fetched by single request
+        """
+        members = sorted((self.members[name] for name in names),
+                         key=lambda e: e.info.header_offset)
+        group, start, end = [], 0, 0
+        for member in members:
+            if group and member.info.header_offset - end > MAX_RANGE_GAP:
+                yield group, start, end
+                group = []
+            if not group:
+                start = member.info.header_offset
+            group.append(member)
+            end = member.end
+        if group:
+            yield group, start, end
+
+    @staticmethod
+    def _read_member(data: bytes, offset: int, info: zipfile.ZipInfo) -> bytes:
+        header = struct.unpack(zipfile.structFileHeader,
+                               data[offset:offset + zipfile.sizeFileHeader])
+        offset += (zipfile.sizeFileHeader
+                   + header[zipfile._FH_FILENAME_LENGTH]
+                   + header[zipfile._FH_EXTRA_FIELD_LENGTH])
+        compressed = data[offset:offset + info.compress_size]
+        if info.compress_type == zipfile.ZIP_STORED:
+            return compressed
+        if info.compress_type == zipfile.ZIP_DEFLATED:
+            return zlib.decompress(compressed, -zlib.MAX_WBITS)
+        raise DeltaError(f"Unsupported compression of {info.filename}")
+
+
+def load_manifest(link: str, session: requests.Session = None) -> MANIFEST:
+    response = (session or requests).get(link, timeout=Download.TIMEOUT)
+    response.raise_for_status()
+    return response.json()['files']
+
+
+def update_by_delta(url: str,
+                    size: int,
+                    manifest: MANIFEST,
+                    app_path: str,
+                    update_path: str,
+                    session: requests.Session = None) -> Optional[DeltaStats]:
+    """
+    Fills update directory with release files
+    :return: None when downloading whole archive is cheaper
+    """
+    started = perf_counter()
+    changed = get_changed(manifest, app_path)
+    archive = RemoteArchive(url, size, session)
+    archive.read_directory()
+    if archive.get_compressed_size(changed) > size * MAX_DELTA_SHARE:
+        return
+
+    archive.extract(changed, update_path, manifest)
+    for name in manifest.keys() - changed:
+        path = get_local_path(update_path, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copy2(get_local_path(app_path, name), path)
+    return DeltaStats(len(manifest), len(changed), archive.transferred,
+                      size, perf_counter() - started)
+
+
+def main():
+    archive_path, manifest_path = sys.argv[1:3]
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(files=make_manifest(archive_path)), f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
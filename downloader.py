@@ -0,0 +1,260 @@
+"""
+Resumable download of update files over HTTP
+"""
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from time import perf_counter, sleep
+from typing import Callable, Optional
+
+import requests
+import urllib3
+
+MiB = 1024 * 1024
+
+
+class DownloadError(Exception):
+    pass
+
+
+@dataclass
+class DownloadStats:
+    total: Optional[int] = None  # None when server doesn't tell
+    received: int = 0  # Including part downloaded before
+    transferred: int = 0  # Got from network by this download
+    resumed_from: int = 0
+    retries: int = 0
+    chunk_size: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """
+        Bytes per second
+        """
+        return self.transferred / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def progress(self) -> Optional[float]:
+        if not self.total:
+            return None
+        return self.received / self.total
+
+    def __str__(self):
+        total = '?' if self.total is None else f"{self.total / MiB:.1f}"
+        return (f"{self.received / MiB:.1f}/{total} MiB, "
+                f"{self.throughput / MiB:.2f} MiB/s, retries: {self.retries}")
+
+
+class Download:
+    """
+    Data saved to "<path>.part" first, so broken download
+    continued by HTTP Range request (even after restart),
+    content checked by SHA-256 before moved to path
+    URL and validator (ETag or Last-Modified) of part kept beside it,
+    so part of other file or of changed one never continued
+    """
+    PART_EXTENSION = 'part'
+    SOURCE_EXTENSION = 'source'
+    MIN_CHUNK_SIZE = 64 * 1024
+    MAX_CHUNK_SIZE = 4 * MiB
+    # Chunk size doubled or halved to keep single read about that long (sec)
+    CHUNK_TARGET_TIME = 0.2
+    PROGRESS_INTERVAL = 1.0
+    MAX_RETRIES = 5  # In row, without any data received
+    RETRY_DELAY = 1.0  # Doubled with each retry in row
+    TIMEOUT = 15.0
+
+    def __init__(self,
+                 url: str,
+                 path: str,
+                 sha256: str = None,
+                 size: int = None,
+                 on_progress: Callable[[DownloadStats], None] = None,
+                 session: requests.Session = None):
+        self.url = url
+        self.path = path
+        self.part_path = f'{path}.{self.PART_EXTENSION}'
+        self.source_path = f'{self.part_path}.{self.SOURCE_EXTENSION}'
+        # Sent as If-Range, so server gives whole file when it changed
+        self._validator: Optional[str] = None
+        self.sha256 = sha256.lower() if sha256 else None
+        self.stats = DownloadStats(size, chunk_size=self.MIN_CHUNK_SIZE)
+        self.on_progress = on_progress
+        self.session = session or requests.Session()
+        self._digest = hashlib.sha256()
+        self._started_at = self._reported_at = 0.0
+
+    def run(self) -> str:
+        self._started_at = perf_counter()
+        self._resume()
+        failures = 0
+        with self._open() as file:
+            while True:
+                received = self.stats.received
+                try:
+                    self._fetch(file)
+                    break
+                except (requests.RequestException, urllib3.exceptions.HTTPError) as e:
+                    failures = 1 if self.stats.received > received else failures + 1
+                    if failures > self.MAX_RETRIES:
+                        raise DownloadError(f"Download failed: {e}") from e
+                    self.stats.retries += 1
+                    delay = self.RETRY_DELAY * 2 ** (failures - 1)
+                    print(f"Download interrupted ({e}), retry in {delay:.0f} sec")
+                    sleep(delay)
+
+        self._report(force=True)
+        self._verify()
+        self._complete()
+        return self.path
+
+    def _open(self):
+        return open(self.part_path, 'ab')
+
+    def _complete(self):
+        os.replace(self.part_path, self.path)
+        self._remove(self.source_path)
+
+    def _discard(self):
+        # Part can't be trusted anymore, so next try starts over
+        self._remove(self.part_path)
+        self._remove(self.source_path)
+
+    @staticmethod
+    def _remove(path: str):
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _resume(self):
+        if not os.path.isfile(self.part_path):
+            return
+        source = self._load_source()
+        # Without checksum only validator proves part is of same file
+        if source.get('url') != self.url or \
+                not (self.sha256 or source.get('validator')):
+            print("Part of other download found, started over")
+            self._discard()
+            return
+        self._validator = source.get('validator')
+        with open(self.part_path, 'rb') as f:
+            while chunk := f.read(self.MAX_CHUNK_SIZE):
+                self._digest.update(chunk)
+                self.stats.received += len(chunk)
+        self.stats.resumed_from = self.stats.received
+
+    def _load_source(self) -> dict:
+        try:
+            with open(self.source_path, encoding='utf-8') as f:
+                source = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return source if isinstance(source, dict) else {}
+
+    def _store_source(self):
+        with open(self.source_path, 'w', encoding='utf-8') as f:
+            json.dump({'url': self.url, 'validator': self._validator}, f)
+
+    def _on_new_content(self, headers):
+        etag = headers.get('ETag')
+        # Weak ETag is not allowed in If-Range
+        if etag and etag.startswith('W/'):
+            etag = None
+        self._validator = etag or headers.get('Last-Modified')
+        self._store_source()
+
+    def _restart(self, file):
+        self._truncate(file)
+        self._digest = hashlib.sha256()
+        self.stats.received = self.stats.resumed_from = 0
+
+    @staticmethod
+    def _truncate(file):
+        file.seek(0)
+        file.truncate()
+
+    def _fetch(self, file):
+        stats = self.stats
+        headers = {'Accept-Encoding': 'identity'}  # Ranges of encoded data are useless
+        if stats.received:
+            headers['Range'] = f'bytes={stats.received}-'
+            if self._validator:
+                headers['If-Range'] = self._validator
+        with self.session.get(self.url, headers=headers,
+                              stream=True, timeout=self.TIMEOUT) as response:
+            if response.status_code == 416:
+                if stats.total in (None, stats.received):
+                    return  # Part is already complete
+                self._restart(file)
+                raise requests.ConnectionError("Part file is longer than expected")
+            if response.status_code >= 500:
+                response.raise_for_status()  # Retried
+            if response.status_code >= 400:
+                raise DownloadError(f"Download failed: HTTP {response.status_code}")
+            if stats.received and response.status_code != 206:
+                print("Server can't resume download or file changed, started over")
+                self._restart(file)
+            if not stats.received:
+                self._on_new_content(response.headers)
+
+            length = response.headers.get('Content-Length')
+            if length is not None and stats.total is None:
+                stats.total = stats.received + int(length)
+            self._read(response.raw, file)
+
+        if stats.total is not None and stats.received < stats.total:
+            raise requests.ConnectionError("Connection closed before download finished")
+
+    def _read(self, raw, file):
+        stats = self.stats
+        while True:
+            started = perf_counter()
+            chunk = raw.read(stats.chunk_size)
+            if not chunk:
+                return
+            file.write(chunk)
+            self._digest.update(chunk)
+            stats.received += len(chunk)
+            stats.transferred += len(chunk)
+            self._adapt_chunk_size(perf_counter() - started, len(chunk))
+            self._report()
+
+    def _adapt_chunk_size(self, read_time: float, length: int):
+        stats = self.stats
+        if length < stats.chunk_size:
+            return  # Last chunk
+        if read_time < self.CHUNK_TARGET_TIME / 2:
+            stats.chunk_size = min(self.MAX_CHUNK_SIZE, stats.chunk_size * 2)
+        elif read_time > self.CHUNK_TARGET_TIME * 2:
+            stats.chunk_size = max(self.MIN_CHUNK_SIZE, stats.chunk_size // 2)
+
+    def _report(self, force=False):
+        now = perf_counter()
+        self.stats.elapsed = now - self._started_at
+        if self.on_progress is None:
+            return
+        if force or now - self._reported_at >= self.PROGRESS_INTERVAL:
+            self._reported_at = now
+            self.on_progress(self.stats)
+
+    def _verify(self):
+        total = self.stats.total
+        if total is not None and self.stats.received != total:
+            self._discard()
+            raise DownloadError(f"Expected {total} bytes, got {self.stats.received}")
+        if self.sha256 is None:
+            return
+        actual = self._digest.hexdigest()
+        if actual != self.sha256:
+            self._discard()
+            raise DownloadError(f"Checksum mismatch: expected {self.sha256}, got {actual}")
+
+
+def get_checksum(url: str, session: requests.Session = None) -> str:
+    """
+    Reads published checksum file ("<sha256>  <filename>" format)
+    """
+    response = (session or requests).get(url, timeout=Download.TIMEOUT)
+    response.raise_for_status()
+    return response.text.split()[0]
@@ -0,0 +1,149 @@
+import os
+from dataclasses import dataclass
+from enum import Enum, auto
+from hashlib import sha1
+from threading import Event, Lock, Thread
+from time import time_ns
+from typing import Callable, Optional
+
+from watchdog.events import (FileCreatedEvent, FileDeletedEvent,
+                             FileModifiedEvent, FileSystemEventHandler)
+
+from commented_config import CommentsHolder
+from utils import set_between
+
+FILE_STATE = tuple[int, int]  # mtime_ns, size
+
+
+class WatcherBackend(Enum):
+    NATIVE = auto()
+    POLLING = auto()
+
+
+@dataclass
+class FileWatcherSettings:
+    """
+    Specifies how config files changes detected
+    """
+    _comments_ = CommentsHolder()
+
+    backend: WatcherBackend = WatcherBackend.NATIVE
+    _comments_.add(f"""
+        [{{default.name}}] How to detect changes: {' | '.join(e.name for e in WatcherBackend)}
+        \t{WatcherBackend.NATIVE.name} - Notifications from system
+        \t{WatcherBackend.POLLING.name} - Check files periodically,
+        \tuse it when app placed on network share or changes are not detected
+    """, locals())
+
+    polling_interval: float = 2.0
+    _comments_.add(f"""
+       [{{default!r}} sec] Delay between checks for {WatcherBackend.POLLING.name} backend
+    """, locals())
+
+    def __post_init__(self):
+        self.polling_interval = set_between(0.1, 60.0, self.polling_interval)
+
+
+class FilePoller(Thread):
+    """
+    Replacement for watchdog observer,
+    all tracked files of directory checked
+    by single directory listing (stat info comes with it on Windows),
+    changes detected by (mtime, size), content hash used
+    when mtime is too recent to be trusted
+    """
+    # Some file systems (FAT, network shares) store
+    # mtime with low precision, so recent rewrite may keep it
+    MTIME_RESOLUTION_NS = 2_000_000_000
+
+    def __init__(self,
+                 is_tracked: Callable[[str], bool],
+                 interval: float):
+        super().__init__(name="File Poller", daemon=True)
+        self.interval = interval
+        self._is_tracked = is_tracked
+        self._handler: Optional[FileSystemEventHandler] = None
+        self._states: dict[str, dict[str, FILE_STATE]] = dict()
+        self._digests: dict[str, bytes] = dict()
+        self._lock = Lock()
+        self._stopped = Event()
+        self.polls_count = 0
+
+    def schedule(self, handler: FileSystemEventHandler, directory: str):
+        with self._lock:
+            self._handler = handler
+            self._states[directory] = self._scan(directory)
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.poll()
+
+    def stop(self):
+        self._stopped.set()
+
+    def poll(self):
+        self.polls_count += 1
+        with self._lock:
+            directories = list(self._states)
+        for directory in directories:
+            current = self._scan(directory)
+            with self._lock:
+                previous = self._states.get(directory)
+                if previous is None:
+                    continue
+                self._states[directory] = current
+            for event in self._get_events(previous, current):
+                self._handler.dispatch(event)
+
+    def _scan(self, directory: str) -> dict[str, FILE_STATE]:
+        states = dict()
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            return states
+        with entries:
+            for entry in entries:
+                path = os.path.normcase(entry.path)
+                if not self._is_tracked(path):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                states[path] = stat.st_mtime_ns, stat.st_size
+        return states
+
+    def _get_events(self,
+                    previous: dict[str, FILE_STATE],
+                    current: dict[str, FILE_STATE]):
+        for path, state in current.items():
+            old_state = previous.get(path)
+            if old_state is None:
+                yield FileCreatedEvent(path)
+            elif self._is_modified(path, old_state, state):
+                yield FileModifiedEvent(path)
+        for path in previous.keys() - current.keys():
+            self._digests.pop(path, None)
+            yield FileDeletedEvent(path)
+
+    def _is_modified(self, path: str, old_state: FILE_STATE, state: FILE_STATE):
+        if time_ns() - state[0] > self.MTIME_RESOLUTION_NS:
+            self._digests.pop(path, None)
+            return old_state != state
+
+        digest = get_digest(path)
+        old_digest = self._digests.get(path)
+        self._digests[path] = digest
+        if old_state != state:
+            return True
+        return old_digest is not None and old_digest != digest
+
+
+def get_digest(path: str) -> Optional[bytes]:
+    try:
+        with open(path, 'rb') as f:
+            return sha1(f.read()).digest()
+    except OSError:
+        return
@@ -1,25 +1,246 @@
 import os
 from abc import ABC
-from contextlib import contextmanager, suppress
-from time import time
-from typing import Generic, TypeVar, TextIO
+from contextlib import suppress
+from copy import copy
+from dataclasses import dataclass
+from hashlib import sha1
+from io import StringIO
+from threading import Lock, current_thread
+from time import sleep
+from typing import Callable, Generic, Optional, TypeVar, TextIO
 
 import inject
-import jsons
 import yaml
-from watchdog.events import PatternMatchingEventHandler
+from watchdog.events import (EVENT_TYPE_CREATED, EVENT_TYPE_DELETED,
+                             EVENT_TYPE_MODIFIED, EVENT_TYPE_MOVED,
+                             FileSystemEvent, FileSystemEventHandler)
 from watchdog.observers import Observer as DirectoryObserver
 from watchdog.observers.api import DEFAULT_OBSERVER_TIMEOUT
 
-from _meta import IndirectDependency, APP_DIR
-from utils import app_abs_path
+import config_validation
+import dataclass_codecs
+from _meta import IndirectDependency
+from config_validation import ValidationReport
+from file_poller import FilePoller, FileWatcherSettings, WatcherBackend
+from utils import app_abs_path, open_atomic
+from worker_pool import DelayedCall, WorkerPool
 
 T = TypeVar('T')
 
 
+@dataclass(frozen=True)
+class FileFingerprint:
+    """
+    Identifies file content known to syncer,
+    so notifications about it can be ignored
+    """
+    size: int
+    digest: bytes
+    mtime_ns: Optional[int] = None
+
+    @classmethod
+    def of(cls, content: bytes, path: str = None):
+        mtime_ns = None
+        if path is not None:
+            with suppress(OSError):
+                mtime_ns = os.stat(path).st_mtime_ns
+        return cls(len(content), sha1(content).digest(), mtime_ns)
+
+    def matches(self, path: str) -> bool:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if stat.st_size != self.size:
+            return False
+        if stat.st_mtime_ns == self.mtime_ns:
+            return True
+        # Same size but unknown time, compare content
+        try:
+            with open(path, 'rb') as f:
+                return sha1(f.read()).digest() == self.digest
+        except OSError:
+            return False
+
+
+class DirectoryWatcher(FileSystemEventHandler):
+    """
+    Single directory observer shared by all syncers,
+    events are routed to syncer by path of file changed
+    """
+    config = inject.attr(FileWatcherSettings)
+
+    def __init__(self, timeout=DEFAULT_OBSERVER_TIMEOUT):
+        self.timeout = timeout
+        self._observer: Optional[DirectoryObserver | FilePoller] = None
+        self._watched_dirs: set[str] = set()
+        self._handlers: dict[str, Callable[[], None]] = dict()
+        self._directory_handlers: dict[str, Callable[[str], None]] = dict()
+        self._lock = Lock()
+
+    @staticmethod
+    def _get_key(path: str):
+        return os.path.normcase(os.path.abspath(path))
+
+    def watch(self, path: str, on_modified: Callable[[], None]):
+        path = self._get_key(path)
+        with self._lock:
+            self._handlers[path] = on_modified
+            self._schedule(os.path.dirname(path))
+
+    def unwatch(self, path: str):
+        path = self._get_key(path)
+        with self._lock:
+            self._handlers.pop(path, None)
+
+    def watch_directory(self, path: str, on_changed: Callable[[str], None]):
+        """
+        Notify when file created, moved or deleted in directory
+        :param on_changed: Gets path of file changed
+        """
+        path = self._get_key(path)
+        with self._lock:
+            self._directory_handlers[path] = on_changed
+            self._schedule(path)
+
+    @inject.params(settings_controller=IndirectDependency.SETTINGS_CONTROLLER)
+    def setup(self, settings_controller):
+        settings_controller.add_option_change_handler(
+            lambda settings: (settings.file_watcher.backend,
+                              settings.file_watcher.polling_interval),
+            lambda _: self.restart()
+        )
+
+    def _schedule(self, directory: str):
+        if directory in self._watched_dirs:
+            return
+        if self._observer is None:
+            self._observer = self._create_observer()
+            self._observer.start()
+        self._observer.schedule(self, directory)
+        self._watched_dirs.add(directory)
+
+    def _create_observer(self):
+        if self.config.backend == WatcherBackend.POLLING:
+            return FilePoller(self.is_tracked, self.config.polling_interval)
+        return DirectoryObserver(self.timeout)
+
+    def is_tracked(self, path: str):
+        return (path in self._handlers
+                or os.path.dirname(path) in self._directory_handlers)
+
+    def restart(self):
+        with self._lock:
+            observer, self._observer = self._observer, None
+            directories, self._watched_dirs = self._watched_dirs, set()
+        # Joined outside of lock, its handlers may watch files meanwhile
+        self._stop_observer(observer)
+        with self._lock:
+            for directory in directories:
+                self._schedule(directory)
+
+    @staticmethod
+    def _stop_observer(observer: Optional[DirectoryObserver | FilePoller]):
+        if observer is None:
+            return
+        observer.stop()
+        # Old observer reports nothing once new one started
+        if observer is not current_thread():
+            observer.join()
+
+    def on_any_event(self, event: FileSystemEvent):
+        if event.is_directory:
+            return
+        if event.event_type not in (EVENT_TYPE_MODIFIED,
+                                    EVENT_TYPE_CREATED,
+                                    EVENT_TYPE_MOVED,
+                                    EVENT_TYPE_DELETED):
+            return
+
+        paths = [self._get_key(event.src_path)]
+        if event.event_type == EVENT_TYPE_MOVED:
+            paths.append(self._get_key(event.dest_path))
+
+        if event.event_type != EVENT_TYPE_MODIFIED:
+            for path in paths:
+                handler = self._directory_handlers.get(os.path.dirname(path))
+                if handler is not None:
+                    handler(path)
+
+        if event.event_type == EVENT_TYPE_DELETED:
+            return
+        handler = self._handlers.get(paths[-1])
+        if handler is not None:
+            handler()
+
+    def stop(self):
+        with self._lock:
+            observer, self._observer = self._observer, None
+            self._watched_dirs.clear()
+        self._stop_observer(observer)
+
+
+class WriteBehindSaver:
+    """
+    Saves requested within delay are merged,
+    so each file is written once with latest data,
+    writing done by worker pool.
+    Save queued before file was loaded from disk is dropped,
+    so it never overwrites external edit
+    """
+    workers = inject.attr(WorkerPool)
+
+    def __init__(self, delay=0.5):
+        self.delay = delay
+        # Data with syncer generation it was taken at
+        self._pending: dict['DataFileSyncer', tuple[object, int]] = dict()
+        self._pending_lock = Lock()
+        self._write_lock = Lock()
+        self._scheduled: Optional[DelayedCall] = None
+
+    def schedule(self, syncer: 'DataFileSyncer', data, generation: int):
+        with self._pending_lock:
+            self._pending[syncer] = data, generation
+            if self._scheduled is None:
+                # Let more saves come
+                self._scheduled = self.workers.submit_later(
+                    self.delay, "save", self._flush_scheduled
+                )
+
+    def _flush_scheduled(self):
+        with self._pending_lock:
+            self._scheduled = None
+        self.flush()
+
+    def flush(self):
+        """
+        Writes all pending saves in current thread
+        """
+        with self._write_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, dict()
+            for syncer, (data, generation) in pending.items():
+                if generation != syncer.generation:
+                    continue  # File loaded since, its content wins
+                try:
+                    syncer.write_file(data)
+                except Exception as e:
+                    print(f"Failed to save {syncer.filename}:", e)
+
+    def has_pending(self):
+        return bool(self._pending)
+
+
 class DataFileSyncer(Generic[T]):
     JSON_DUMPER_KWARGS = {}
     YAML_DUMPER_KWARGS = {}
+    # Editors may write single save in several steps,
+    # so reload starts when no changes made for this time (sec)
+    RELOAD_SETTLE_DELAY = 0.3
+    STABLE_SIZE_CHECK_DELAY = 0.05
+    watcher = inject.attr(DirectoryWatcher)
+    saver = inject.attr(WriteBehindSaver)
+    workers = inject.attr(WorkerPool)
 
     def __init__(self,
                  filename: str,
@@ -29,7 +250,16 @@ class DataFileSyncer(Generic[T]):
         self.data = data
         self._class = data_type or type(data)
         self.filename = f'{filename}.{extension}'
-        self.dir_observer = LazyDirectoryObserver()
+        self._fingerprint: Optional[FileFingerprint] = None
+        self._reload_timer: Optional[DelayedCall] = None
+        self._reload_lock = Lock()
+        # Problems found by last load, quarantined items written back on save
+        self.validation = ValidationReport()
+        # Incremented by each load from disk,
+        # saves queued before it are stale
+        self.generation = 0
+        # Taken by direct save and by write-behind one
+        self._write_lock = Lock()
 
     def start(self):
         self.load_file()
@@ -40,54 +270,134 @@ class DataFileSyncer(Generic[T]):
         carryon.append(self.filename)
 
     def _watch_file(self):
-        handler = PatternMatchingEventHandler(patterns=[app_abs_path(self.filename)],
-                                              case_sensitive=True)
+        self.watcher.watch(app_abs_path(self.filename),
+                           self._on_file_modified)
+
+    def stop(self):
+        self.watcher.unwatch(app_abs_path(self.filename))
+        with self._reload_lock:
+            if self._reload_timer is not None:
+                self._reload_timer.cancel()
+                self._reload_timer = None
+
+    def _on_file_modified(self):
+        # Restart countdown on each event
+        with self._reload_lock:
+            if self._reload_timer is not None:
+                self._reload_timer.cancel()
+            self._reload_timer = self.workers.submit_later(
+                self.RELOAD_SETTLE_DELAY, "reload", self._reload_when_settled
+            )
+
+    def _reload_when_settled(self):
+        path = app_abs_path(self.filename)
+        if not self._is_settled(path):
+            self._on_file_modified()
+            return
+
+        with self._reload_lock:
+            self._reload_timer = None
 
-        def on_modified(event):
-            if not self.dir_observer.is_completely_awake():
-                return
-            self.load_file()
+        fingerprint = self._fingerprint
+        if fingerprint is not None and fingerprint.matches(path):
+            return  # Own write or content already loaded
+        self.load_file()
 
-        handler.on_modified = on_modified
-        self.dir_observer.schedule(handler, APP_DIR)
-        self.dir_observer.start()
+    def _is_settled(self, path: str):
+        state = get_file_state(path)
+        sleep(self.STABLE_SIZE_CHECK_DELAY)
+        return state == get_file_state(path)
 
     def load_file(self):
         if not os.path.exists(self.filename):
             self.save_file()
             return
 
-        with self.dir_observer.overlook():
-            with open(app_abs_path(self.filename), encoding="utf-8-sig") as f:
-                new_data: T = self._load(f)
+        path = app_abs_path(self.filename)
+        with open(path, 'rb') as f:
+            content = f.read()
+        # Pending save made from older data would overwrite this content
+        self.generation += 1
+        self._fingerprint = FileFingerprint.of(content, path)
+        self.validation = ValidationReport()
+        new_data: T = self._load_content(content)
+        self._print_errors()
 
         if new_data is None:
-            self.save_file()
+            # Broken file left for user to fix, it is reloaded then
             return
 
         if new_data != self.data:
             self.data = new_data
             self.on_file_reloaded()
 
+    def _load_content(self, content: bytes) -> Optional[T]:
+        return self._load(StringIO(
+            content.decode("utf-8-sig", errors="replace")
+        ))
+
     def _load(self, stream: TextIO):
-        with suppress(jsons.DeserializationError, yaml.YAMLError):
-            return jsons.load(yaml.load(
-                stream, yaml.CSafeLoader
-            ) or {}, self._class)
+        try:
+            return config_validation.load(stream, self._class, self.validation)
+        except yaml.YAMLError as e:
+            print(f"Unable to parse {self.filename}:", e)
 
-    def save_file(self):
-        with self.dir_observer.overlook():
-            with open(app_abs_path(self.filename), "w", encoding="utf-8") as f:
-                self._dump(f)
+    def _print_errors(self):
+        errors = self.validation.errors
+        if not errors:
+            return
+        print(f"Errors in {self.filename}:")
+        for error in errors:
+            print(f"  {self.filename}:{error}")
+        if self.validation.quarantine:
+            print(f"  Items skipped: {len(self.validation.quarantine)}")
 
-    def _dump(self, stream: TextIO):
-        yaml.dump(jsons.dump(self.data, **self.JSON_DUMPER_KWARGS),
-                  stream, yaml.CSafeDumper, **self.YAML_DUMPER_KWARGS)
+    def save_file(self):
+        self.write_file(self.data)
+
+    def save_file_later(self):
+        generation = self.generation
+        self.saver.schedule(self, self.snapshot(), generation)
+
+    def snapshot(self) -> T:
+        """
+        Copy of data safe to be dumped from another thread
+        """
+        return copy(self.data)
+
+    def write_file(self, data: T):
+        text = StringIO()
+        self._dump(text, data)
+        content = text.getvalue().replace('\n', os.linesep).encode("utf-8")
+        path = app_abs_path(self.filename)
+        with self._write_lock:
+            # Remember content before it appears on disk,
+            # so notification about it ignored no matter when it comes
+            self._fingerprint = FileFingerprint.of(content)
+            with open_atomic(path, 'wb') as f:
+                f.write(content)
+            self._fingerprint = FileFingerprint.of(content, path)
+        return content
+
+    def _dump(self, stream: TextIO, data: T):
+        raw = dataclass_codecs.dump(data, **self.JSON_DUMPER_KWARGS)
+        quarantine = self.validation.quarantine
+        if quarantine and isinstance(raw, dict):
+            # Invalid items kept in file until user fixes them
+            for key, value in quarantine.items():
+                raw.setdefault(key, value)
+        yaml.dump(raw, stream, yaml.CSafeDumper, **self.YAML_DUMPER_KWARGS)
 
     def on_file_reloaded(self):
         pass
 
 
+def get_file_state(path: str) -> Optional[tuple[int, int]]:
+    with suppress(OSError):
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+
 class Syncable(ABC):
     def __init__(self, syncer: DataFileSyncer):
         self._syncer = syncer
@@ -97,53 +407,4 @@ class Syncable(ABC):
         self._syncer.load_file()
 
     def save(self):
-        self._syncer.save_file()
-
-
-class LazyDirectoryObserver(DirectoryObserver):
-    def __init__(self, timeout=DEFAULT_OBSERVER_TIMEOUT):
-        super().__init__(timeout)
-        self._is_sleeping = False
-        self._still_sleepy = False
-        self._awake_complete_time = 0  # timestamp
-
-    def dispatch_events(self, *args, **kwargs):
-        if self._is_sleeping:
-            return
-
-        if self._still_sleepy:
-            if not self.is_sleepy():
-                self._finish_awakening()
-            return
-        
-        super(LazyDirectoryObserver, self).dispatch_events(*args, **kwargs)
-
-    @contextmanager
-    def overlook(self):
-        self.sleep()
-        try:
-            yield
-        finally:
-            self.wakeup()
-
-    def sleep(self):
-        if not self.is_alive():
-            return
-        self._is_sleeping = True
-        self._still_sleepy = True
-
-    def wakeup(self):
-        if not self._is_sleeping:
-            return
-        self._is_sleeping = False
-        self._awake_complete_time = time() + self.timeout
-
-    def _finish_awakening(self):
-        self.event_queue.queue.clear()
-        self._still_sleepy = False
-
-    def is_completely_awake(self):
-        return not self._is_sleeping and not self._still_sleepy
-
-    def is_sleepy(self):
-        return time() <= self._awake_complete_time
+        self._syncer.save_file_later()
@@ -1,3 +1,4 @@
+from concurrent.futures import Future
 from enum import Enum
 from os.path import dirname
 
@@ -12,7 +13,9 @@ from active_window_checker import WindowInfo
 from color_filter import ColorFilter
 from custom_gui_elements import MultiStateButton, PageSwitchController, Switcher
 from inversion_rules import InversionRule, InversionRulesController, LookForTitle, RuleType
+from main_thread_loop import execute_in_main_thread
 from models.auto_update import VersionInfo
+from worker_pool import WorkerPool
 
 
 class RuleCreationWindow(guitils.BaseInteractiveWindow):
@@ -84,10 +87,15 @@ class RuleCreationWindow(guitils.BaseInteractiveWindow):
         self.path_ref = [self.winfo.path]
         self._first_color_filter_change = True
 
-    def run(self) -> tuple[InversionRule, str]:
+    def open(self):
         self.color_filter.test_mode = True
-        super().run()
+        super().open()
+
+    def close(self):
+        super().close()
         self.color_filter.test_mode = False
+
+    def get_result(self) -> tuple[InversionRule, str]:
         return self.rule, self.name
 
     def init_window(self, **kwargs):
@@ -508,8 +516,7 @@ class RuleRemovingWindow(guitils.BaseInteractiveWindow):
         self.pages: PageSwitchController = None
         self.rules_to_remove: set[str] = set()
 
-    def run(self) -> set[str]:
-        super().run()
+    def get_result(self) -> set[str]:
         return self.rules_to_remove
 
     def build_layout(self):
@@ -653,6 +660,7 @@ class RuleDescriptionWindow(guitils.BaseNonBlockingWindow):
 
 class UpdateRequestWindow(guitils.ConfirmationWindow):
     title = guitils.get_title("new release is out!")
+    workers = inject.attr(WorkerPool)
 
     class ID(guitils.ConfirmationWindow.ID):
         INPUT: str
@@ -749,10 +757,24 @@ class UpdateRequestWindow(guitils.ConfirmationWindow):
         ))
 
     def show_changelog(self, event, window, values):
-        import _meta as app
         link = "https://raw.githubusercontent.com/MaxBQb/InversionFilterManager/master/CHANGELOG.md"
+        # Dialog stays responsive while changelog loads
+        self.workers.submit("preview", requests.get, link).add_done_callback(
+            self._on_changelog_loaded
+        )
+
+    @execute_in_main_thread()
+    def _on_changelog_loaded(self, response: Future):
+        import _meta as app
+        if not self.is_running:
+            return
+        try:
+            text = response.result().text
+        except Exception as e:
+            print("Failed to load changelog:", e)
+            return
         self._open_dependent_window(guitils.OutputWindow(
-            requests.get(link).text, f"Changelog (current version {app.__version__})"
+            text, f"Changelog (current version {app.__version__})"
         ))
 
 
@@ -771,8 +793,7 @@ class ChooseRuleCandidateWindow(guitils.BaseInteractiveWindow):
         self.name_to_winfo_map = dict()
         self.property_to_id_map = dict()
 
-    def run(self) -> WindowInfo:
-        super().run()
+    def get_result(self) -> WindowInfo:
         return self.chosen_window
 
     @staticmethod
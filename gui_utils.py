@@ -1,10 +1,13 @@
+import asyncio
 import ctypes
 from typing import Callable, Any
 
 import PySimpleGUI as sg
+import inject
 
 import gui_utils
 from _meta import __product_name__ as app_name
+from main_thread_loop import MainExecutor
 from utils import StrHolder, max_len, app_abs_path, set_between
 
 BUTTON_DEFAULTS = dict(
@@ -137,20 +140,26 @@ class BaseNonBlockingWindow:
     def __init__(self):
         self.window: sg.Window = None
         self.layout: list[list] = []
-        self.dependent_windows: set[BaseNonBlockingWindow] = set()
+        # Dependent windows run as tasks of main thread loop
+        self.dependent_windows: dict[BaseNonBlockingWindow, asyncio.Task] = dict()
         # Applies default input style
         self._inputs: list[str] = []
 
-    def _add_dependency(self, dependent_window):
-        self.dependent_windows.add(dependent_window)
-
-    def _open_dependent_window(self, dependent_window):
-        self._add_dependency(dependent_window)
-        return dependent_window.run()
+    def _open_dependent_window(self, dependent_window: 'BaseNonBlockingWindow'):
+        """
+        Should be called from main thread,
+        window runs as task, so this one keeps running
+        """
+        task = inject.instance(MainExecutor).start_task(dependent_window.run_async())
+        self.dependent_windows[dependent_window] = task
+        return task
 
     def _close_dependent(self):
-        for dependent in self.dependent_windows:
-            dependent.send_close_event()
+        for dependent, task in self.dependent_windows.items():
+            if dependent.window is None:
+                task.cancel()  # Not opened yet
+            else:
+                dependent.send_close_event()
 
     def run(self):
         """
@@ -162,6 +171,12 @@ class BaseNonBlockingWindow:
         self.init_window()
         self.dynamic_build()
 
+    async def run_async(self):
+        """
+        Same as run, window doesn't block anyway
+        """
+        return self.run()
+
     def build_layout(self):
         self.layout = [[]]
 
@@ -224,6 +239,11 @@ class BaseInteractiveWindow(BaseNonBlockingWindow):
 
     title = get_title("base window")
 
+    # Delay between reads of window running as task,
+    # doubled while no events come, so idle window rarely wakes app
+    MIN_POLL_INTERVAL = 0.02
+    MAX_POLL_INTERVAL = 0.2
+
     def __init__(self):
         super().__init__()
         self.event_handlers: dict[str, list[BaseInteractiveWindow.HANDLER]] = {}
@@ -233,13 +253,29 @@ class BaseInteractiveWindow(BaseNonBlockingWindow):
         """
         Should be used to open window
         """
+        self.open()
+        self.dispatch_events()
+        return self.get_result()
+
+    async def run_async(self) -> Any:
+        """
+        Same as run, but other coroutines
+        of main thread keep running while window is open
+        """
+        self.open()
+        await self.dispatch_events_async()
+        return self.get_result()
+
+    def open(self):
         self.build_layout()
         self.add_title()
         self.add_submit_button()
         self.set_handlers()
         self.init_window()
         self.dynamic_build()
-        self.dispatch_events()
+
+    def get_result(self) -> Any:
+        return None
 
     def add_submit_button(self, **kwargs):
         super().add_submit_button(
@@ -270,12 +306,31 @@ class BaseInteractiveWindow(BaseNonBlockingWindow):
             yield self.window.read()
         self.window.close()
 
+    async def run_event_loop_async(self):
+        self.is_running = True
+        interval = self.MIN_POLL_INTERVAL
+        while self.is_running:
+            event, values = self.window.read(timeout=0)
+            if event == sg.TIMEOUT_KEY:
+                await asyncio.sleep(interval)
+                interval = min(interval * 2, self.MAX_POLL_INTERVAL)
+                continue
+            interval = self.MIN_POLL_INTERVAL
+            yield event, values
+        self.window.close()
+
     def dispatch_events(self):
-        default_handler = [self.on_unhandled_event]
         for event, values in self.run_event_loop():
-            handlers = self.event_handlers.get(event, default_handler)
-            for handler in handlers:
-                handler(event, self.window, values)
+            self.dispatch_event(event, values)
+
+    async def dispatch_events_async(self):
+        async for event, values in self.run_event_loop_async():
+            self.dispatch_event(event, values)
+
+    def dispatch_event(self, event: str, values):
+        handlers = self.event_handlers.get(event, [self.on_unhandled_event])
+        for handler in handlers:
+            handler(event, self.window, values)
 
     def on_unhandled_event(self,
                            event: str,
@@ -311,8 +366,7 @@ class ConfirmationWindow(BaseInteractiveWindow):
     def build_layout(self):
         self.layout.append([center(sg.Text(self.question))])
 
-    def run(self) -> bool:
-        super().run()
+    def get_result(self) -> bool:
         return self.positive_answer
 
     def add_submit_button(self, yes_kwargs: dict = {}, no_kwargs: dict = {}, **common):
@@ -1,5 +1,5 @@
-from contextlib import contextmanager
-from queue import Queue
+import asyncio
+from contextlib import asynccontextmanager
 
 import inject
 import keyboard
@@ -20,14 +20,17 @@ class InteractionManager:
 
     def __init__(self):
         self._current_window: gui_utils.BaseNonBlockingWindow = None
-
-    @contextmanager
-    def _open_window(self, window: gui_utils.BaseNonBlockingWindow):
-        try:
-            self._current_window = window
-            yield window
-        finally:
-            self._current_window = None
+        # Dialogs run as tasks, so only one is shown at once
+        self._window_lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def _open_window(self, window: gui_utils.BaseNonBlockingWindow):
+        async with self._window_lock:
+            try:
+                self._current_window = window
+                yield window
+            finally:
+                self._current_window = None
 
     def close_current_window(self):
         if self._current_window is not None:
@@ -46,19 +49,19 @@ class InteractionManager:
         for k, v in hotkeys.items():
             keyboard.add_hotkey(initial_hotkey + k, v)
 
-    @execute_in_main_thread()
-    def append_current_app(self, winfo: WindowInfo = None):
+    @execute_in_main_thread(dedupe=True)
+    async def append_current_app(self, winfo: WindowInfo = None):
         winfo = winfo or self.state_controller.last_active_window
         if not winfo:
             return
 
-        with self._open_window(gui.RuleCreationWindow(winfo)) as window:
-            rule, name = window.run()
+        async with self._open_window(gui.RuleCreationWindow(winfo)) as window:
+            rule, name = await window.run_async()
             if name is not None and rule:
                 self.rules_controller.add_rule(name, rule)
 
-    @execute_in_main_thread()
-    def delete_current_app(self, winfo: WindowInfo = None):
+    @execute_in_main_thread(dedupe=True)
+    async def delete_current_app(self, winfo: WindowInfo = None):
         winfo = winfo or self.state_controller.last_active_window
         if not winfo:
             return
@@ -72,14 +75,14 @@ class InteractionManager:
             )
         )
 
-        with self._open_window(gui.RuleRemovingWindow(active_rules)) as window:
-            rules = window.run()
+        async with self._open_window(gui.RuleRemovingWindow(active_rules)) as window:
+            rules = await window.run_async()
 
             if rules:
                 self.rules_controller.remove_rules(rules)
 
-    @execute_in_main_thread()
-    def choose_window_to_remove_rules(self):
+    @execute_in_main_thread(dedupe=True)
+    async def choose_window_to_remove_rules(self):
         if not self.state_controller.last_active_window:
             return
 
@@ -92,35 +95,42 @@ class InteractionManager:
             return
 
         if len(candidates) == 1:
-            self.delete_current_app(candidates[0])
+            await self.delete_current_app(candidates[0])
             return
 
-        with self._open_window(gui.ChooseRemoveCandidateWindow(candidates)) as window:
-            winfo = window.run()
+        async with self._open_window(gui.ChooseRemoveCandidateWindow(candidates)) as window:
+            winfo = await window.run_async()
 
-            if winfo:
-                self.delete_current_app(winfo)
+        if winfo:
+            await self.delete_current_app(winfo)
 
-    @execute_in_main_thread()
-    def choose_window_to_make_rule(self):
+    @execute_in_main_thread(dedupe=True)
+    async def choose_window_to_make_rule(self):
         if not self.state_controller.last_active_window:
             return
 
         candidates = list(self.state_controller.last_active_windows)
 
         if len(candidates) == 1:
-            self.append_current_app(candidates[0])
+            await self.append_current_app(candidates[0])
             return
 
-        with self._open_window(gui.ChooseAppendCandidateWindow(candidates)) as window:
-            winfo = window.run()
+        async with self._open_window(gui.ChooseAppendCandidateWindow(candidates)) as window:
+            winfo = await window.run_async()
+
+        if winfo:
+            await self.append_current_app(winfo)
 
-            if winfo:
-                self.append_current_app(winfo)
+    @execute_in_main_thread()
+    async def request_update(self, version: VersionInfo) -> bool:
+        async with self._open_window(gui.UpdateRequestWindow(version)) as window:
+            return await window.run_async()
 
     @execute_in_main_thread()
-    def request_update(self,
-                       version: VersionInfo,
-                       response: Queue):
-        with self._open_window(gui.UpdateRequestWindow(version)) as window:
-            response.put_nowait(window.run())
+    async def request_rollback(self) -> bool:
+        window = gui_utils.ConfirmationWindow(
+            "Roll back to version installed before last update?\n"
+            "App will be restarted"
+        )
+        async with self._open_window(window):
+            return await window.run_async()
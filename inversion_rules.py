@@ -1,11 +1,21 @@
+import json
+import os
 import typing
 from dataclasses import dataclass
 from enum import Enum, auto
-from re import compile
+from functools import cached_property
+from hashlib import sha1
+from re import Pattern, compile
+from threading import RLock
 from typing import TYPE_CHECKING, TextIO
+from weakref import WeakValueDictionary
 
-from commented_config import CommentsHolder, get_comments_holder
+import inject
+
+from _meta import __version__
+from commented_config import CommentsHolder, get_comments_text
 from file_tracker import DataFileSyncer, Syncable
+from utils import app_abs_path, open_atomic
 
 if TYPE_CHECKING:
     from active_window_checker import WindowInfo
@@ -121,8 +131,26 @@ class InversionRule:
             self._check_title = False
             self.look_for_title = None
 
-        self._title_regex = try_compile(self.title_regex)
-        self._path_regex = try_compile(self.path_regex)
+        # Compile now to reject invalid regex on load
+        _ = self._title_regex, self._path_regex
+
+    # Compiled lazily, since rules restored
+    # from snapshot skip __post_init__
+    @cached_property
+    def _title_regex(self):
+        return try_compile(self.title_regex)
+
+    @cached_property
+    def _path_regex(self):
+        return try_compile(self.path_regex)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_title_regex', None)
+        state.pop('_path_regex', None)
+        if '_pids' in state:
+            state['_pids'] = set()
+        return state
 
     def get_type(self):
         return self._type
@@ -161,6 +189,26 @@ class InversionRule:
 
 
 RULES = dict[str, InversionRule]
+RULES_EXTENSION = 'yaml'
+
+
+@dataclass
+class RulesSettings:
+    _comments_ = CommentsHolder()
+
+    rules_directory: str = "rules.d"
+    _comments_.add("""
+       [{default!r}] Directory with additional rules files (*.yaml),
+       each file has same format as inversion_rules.yaml
+       and reloaded independently
+    """, locals())
+
+    new_rules_file: str = None
+    _comments_.add("""
+       [inversion_rules] Where to store rules added from app:
+       name of file from rules directory (without .yaml),
+       its rules override ones with same name from other files
+    """, locals())
 
 
 class InversionRulesController(Syncable):
@@ -174,40 +222,161 @@ class InversionRulesController(Syncable):
     Recommends to do nothing
     """
 
+    config = inject.attr(RulesSettings)
+
     def __init__(self):
         self.rules: RULES = dict()
         self.included: RULES = dict()
         self.excluded: RULES = dict()
         self.ignored: RULES = dict()
-        super().__init__(RulesSyncer("inversion_rules", self.rules, RULES))
-        self._syncer.on_file_reloaded = lambda: self.load_rules(self._syncer.data)
+        super().__init__(RulesSyncer("inversion_rules", dict(), RULES))
+        # Rules files from rules directory by name
+        self._extra_syncers: dict[str, RulesSyncer] = dict()
+        # Files are added by watcher thread, reloaded by workers
+        # and edited from main thread, syncers data replaced, not changed
+        self._rules_lock = RLock()
 
     def setup(self):
         self._syncer.start()
         self._syncer.preserve_on_update()
+        self._setup_rules_directory()
+        self._syncer.on_file_reloaded = self.merge_rules
+        self.merge_rules()
+
+    def _setup_rules_directory(self):
+        directory = app_abs_path(self.config.rules_directory)
+        os.makedirs(directory, exist_ok=True)
+        for filename in sorted(os.listdir(directory)):
+            self._on_rules_directory_changed(os.path.join(directory, filename), False)
+        self._syncer.watcher.watch_directory(directory, self._on_rules_directory_changed)
+
+    def _on_rules_directory_changed(self, path: str, merge=True):
+        name, extension = os.path.splitext(os.path.basename(path))
+        if extension != '.' + RULES_EXTENSION:
+            return
+
+        exists = os.path.isfile(path)
+        with self._rules_lock:
+            syncer = self._extra_syncers.get(name)
+            if not exists and syncer is not None:
+                del self._extra_syncers[name]
+        if exists and syncer is None:
+            self._add_rules_file(name)
+        elif not exists and syncer is not None:
+            syncer.stop()
+        else:
+            return
+
+        if merge:
+            self.merge_rules()
+
+    def _add_rules_file(self, name: str):
+        syncer = RulesSyncer(
+            os.path.join(self.config.rules_directory, name),
+            dict(), RULES, RULES_EXTENSION
+        )
+        # Loaded outside of lock, file may be big
+        syncer.start()
+        with self._rules_lock:
+            added = self._extra_syncers.setdefault(name, syncer)
+        if added is not syncer:  # Added by other thread meanwhile
+            syncer.stop()
+            return added
+        syncer.preserve_on_update()
+        syncer.on_file_reloaded = self.merge_rules
+        return syncer
+
+    def _get_target_syncer(self) -> 'RulesSyncer':
+        name = self.config.new_rules_file
+        if not name:
+            return self._syncer
+        with self._rules_lock:
+            syncer = self._extra_syncers.get(name)
+        return syncer or self._add_rules_file(name)
+
+    def _get_syncers(self) -> list['RulesSyncer']:
+        """
+        In merge order: main file, then rules directory
+        (in alphabetical order), file for new rules goes last
+        """
+        target_name = self.config.new_rules_file
+        with self._rules_lock:
+            syncers = [self._syncer, *(
+                syncer for name, syncer in sorted(self._extra_syncers.items())
+                if name != target_name
+            )]
+            target = self._extra_syncers.get(target_name)
+        if target is not None:
+            syncers.append(target)
+        return syncers
+
+    def load(self):
+        for syncer in self._get_syncers():
+            syncer.load_file()
+
+    def merge_rules(self):
+        # Later files override rules with same name from previous ones
+        with self._rules_lock:
+            rules = dict()
+            for syncer in self._get_syncers():
+                rules.update(syncer.data)
+            self.load_rules(rules)
 
     def load_rules(self, rules: RULES):
-        self.rules = rules
-        self.included, self.excluded, self.ignored = dict(), dict(), dict()
+        included, excluded, ignored = dict(), dict(), dict()
+        accessories = {
+            RuleType.INCLUDE: included,
+            RuleType.EXCLUDE: excluded,
+            RuleType.IGNORE: ignored,
+        }
         for name, rule in rules.items():
-            self._detect_accessory(rule)[name] = rule
+            accessories[rule.get_type()][name] = rule
+        self.rules = rules
+        self.included, self.excluded, self.ignored = included, excluded, ignored
         self.on_rules_changed()
 
     def add_rule(self, name: str, rule: InversionRule):
-        self.rules[name] = rule
-        self._detect_accessory(rule)[name] = rule
-        self.on_rules_changed()
-        self._syncer.save_file()
+        """
+        Stored in file for new rules only, other files (e.g. rule packs)
+        untouched, rule overrides theirs with same name
+        """
+        syncer = self._get_target_syncer()
+        with self._rules_lock:
+            syncer.data = {**syncer.data, name: rule}
+            self.merge_rules()
+        syncer.save_file_later()
 
     def remove_rules(self, names: set[str]):
+        """
+        Removed from file the rule in use comes from,
+        rule with same name in earlier file (shadowed one) takes its place
+        """
         if not names:
             return
 
-        for name in names:
-            del self._detect_accessory(self.rules[name])[name]
-            del self.rules[name]
-        self._syncer.save_file()
-        self.on_rules_changed()
+        with self._rules_lock:
+            # Later files override earlier ones, so the last one wins
+            sources: dict[str, RulesSyncer] = dict()
+            shadowed = set()
+            for syncer in self._get_syncers():
+                for name in syncer.data.keys() & names:
+                    if name in sources:
+                        shadowed.add(name)
+                    sources[name] = syncer
+            removed: dict[RulesSyncer, set[str]] = dict()
+            for name, syncer in sources.items():
+                removed.setdefault(syncer, set()).add(name)
+            for syncer, syncer_names in removed.items():
+                syncer.data = {
+                    name: rule for name, rule in syncer.data.items()
+                    if name not in syncer_names
+                }
+            self.merge_rules()
+        for syncer in removed:
+            syncer.save_file_later()
+        for name in sorted(shadowed):
+            print(f"Rule {name} removed from {sources[name].filename}, "
+                  f"shadowed one from other rules file is used now")
 
     def get_filter(self, info: 'WindowInfo') -> typing.Optional[tuple[str, float]]:
         possibilities = (
@@ -252,10 +421,17 @@ class InversionRulesController(Syncable):
         pass
 
 
+# Patterns of loaded rules, so reload compiles only changed ones
+_patterns: WeakValueDictionary[str, Pattern] = WeakValueDictionary()
+
+
 def try_compile(raw_regex: str):
     if not raw_regex:
         return
-    return compile(raw_regex)
+    pattern = _patterns.get(raw_regex)
+    if pattern is None:
+        pattern = _patterns[raw_regex] = compile(raw_regex)
+    return pattern
 
 
 def check_text(text: str, plain: str, regex):
@@ -265,15 +441,98 @@ def check_text(text: str, plain: str, regex):
 
 
 class RulesSyncer(DataFileSyncer):
+    """
+    Keeps snapshot of parsed rules next to rules file,
+    snapshot used while rules file and app version unchanged.
+    Snapshot is plain JSON (header line, then rules state),
+    so file planted there can't run code
+    """
     JSON_DUMPER_KWARGS = dict(
         strip_properties=True,
         strip_privates=True,
         strip_nulls=True
     )
+    SNAPSHOT_EXTENSION = 'cache'
+    SNAPSHOT_FORMAT = 2
+    # Enums of rule state stored by names
+    SNAPSHOT_ENUMS = {cls.__name__: cls for cls in (LookForTitle, RuleType)}
+
+    @property
+    def snapshot_filename(self):
+        return f'{self.filename}.{self.SNAPSHOT_EXTENSION}'
+
+    @classmethod
+    def _get_snapshot_key(cls, content: bytes) -> dict:
+        return dict(
+            format=cls.SNAPSHOT_FORMAT,
+            version=__version__,
+            source=sha1(content).hexdigest(),
+        )
 
-    def _dump(self, stream: TextIO):
-        for comments in get_comments_holder(InversionRule).content.values():
-            stream.writelines([*comments, "\n"])
+    def _load_content(self, content: bytes):
+        key = self._get_snapshot_key(content)
+        data = self._read_snapshot(key)
+        if data is None:
+            data = super()._load_content(content)
+            # Snapshot would lose quarantined rules
+            if data is not None and not self.validation.errors:
+                self._write_snapshot(key, data)
+        return data
+
+    def write_file(self, data: RULES):
+        content = super().write_file(data)
+        if not self.validation.quarantine:
+            self._write_snapshot(self._get_snapshot_key(content), data)
+        return content
+
+    def _read_snapshot(self, key: dict) -> typing.Optional[RULES]:
+        try:
+            with open(app_abs_path(self.snapshot_filename), encoding='utf-8') as f:
+                if json.loads(f.readline()) != key:
+                    return
+                return {
+                    name: self._restore_rule(state)
+                    for name, state in json.load(f).items()
+                }
+        except Exception:  # Missing or broken snapshot
+            return
 
-        if self.data:
-            super()._dump(stream)
+    def _write_snapshot(self, key: dict, data: RULES):
+        try:
+            with open_atomic(app_abs_path(self.snapshot_filename), encoding='utf-8') as f:
+                json.dump(key, f)
+                f.write('\n')
+                json.dump({
+                    name: self._get_rule_state(rule)
+                    for name, rule in data.items()
+                }, f, separators=(',', ':'))
+        except (OSError, TypeError, ValueError) as e:
+            print("Unable to save rules snapshot:", e)
+
+    @staticmethod
+    def _get_rule_state(rule: InversionRule) -> dict:
+        state = rule.__getstate__()
+        state.pop('_pids', None)  # Restored empty
+        return {
+            key: [type(value).__name__, value.name] if isinstance(value, Enum) else value
+            for key, value in state.items()
+        }
+
+    @classmethod
+    def _restore_rule(cls, state: dict) -> InversionRule:
+        # Already checked on parsing, so __post_init__ skipped
+        rule = InversionRule.__new__(InversionRule)
+        for key, value in state.items():
+            if isinstance(value, list):
+                enum_name, member = value
+                value = cls.SNAPSHOT_ENUMS[enum_name][member]
+            rule.__dict__[key] = value
+        if rule.remember_processes:
+            rule._pids = set()
+        return rule
+
+    def _dump(self, stream: TextIO, data: RULES):
+        stream.write(get_comments_text(InversionRule, __version__))
+
+        if data:
+            super()._dump(stream, data)
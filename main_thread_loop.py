@@ -1,17 +1,82 @@
+import asyncio
+import heapq
+import itertools
 import threading
+from collections import Counter, defaultdict, deque
+from concurrent.futures import Future
+from contextlib import suppress
+from copy import copy
 from dataclasses import dataclass, field
-from queue import PriorityQueue
-from typing import Callable
+from functools import partial, update_wrapper
+from time import monotonic, perf_counter
+from typing import Callable, Hashable, Optional
 
 import inject
 
-from utils import show_exceptions
+from commented_config import CommentsHolder
+from utils import set_between, show_exceptions
 
 
-@dataclass(order=True)
+@dataclass
+class MainThreadSettings:
+    """
+    Main thread runs color filter changes and dialogs,
+    so calls made there should be short
+    """
+    _comments_ = CommentsHolder()
+
+    slow_call_threshold: float = 0.1
+    _comments_.add("""
+       [{default!r} sec] Warn in console about main thread calls
+       running longer, see diagnostics dump from tray for totals
+    """, locals())
+
+    def __post_init__(self):
+        self.slow_call_threshold = set_between(0.001, 60.0, self.slow_call_threshold)
+
+
+@dataclass
+class CallStats:
+    calls: int = 0
+    slow_calls: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+    run_total: float = 0.0
+    run_max: float = 0.0
+
+    def add(self, wait: float, run: float, slow: bool):
+        self.calls += 1
+        self.slow_calls += slow
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.run_total += run
+        self.run_max = max(self.run_max, run)
+
+
+def get_label(func: Callable) -> str:
+    return getattr(func, '__qualname__', None) or repr(func)
+
+
+@dataclass(order=True, slots=True)
 class Callback:
     func: Callable = field(compare=False)
-    priority: int = 10
+    priority: int = field(default=10, compare=False)
+    coalesce_key: Optional[Hashable] = field(default=None, compare=False)
+    # Receives result, when caller waits for it
+    future: Optional[Future] = field(default=None, compare=False)
+    # Callback not started until then is dropped (monotonic time)
+    deadline: Optional[float] = field(default=None, compare=False)
+    # Name used in stats, function qualname by default
+    label: Optional[str] = field(default=None, compare=False)
+    # Same function with same args, only the latest pending call runs
+    call_key: Optional[Hashable] = field(default=None, compare=False)
+    # Priority aged by time of sending, see MainExecutor.PRIORITY_AGING
+    rank: float = field(default=0.0, init=False)
+    # Keeps FIFO order of callbacks with same rank
+    sequence: int = field(default=0, init=False)
+    enqueued_at: float = field(default=0.0, init=False, compare=False)
+    # Newer call with same coalesce or call key sent
+    superseded: bool = field(default=False, init=False, compare=False)
 
 
 def is_main_thread():
@@ -19,38 +84,434 @@ def is_main_thread():
 
 
 class MainExecutor:
+    """
+    Runs callbacks sent from any thread as part of main thread event loop,
+    loop is woken up by call_soon_threadsafe and awaited otherwise,
+    so other coroutines of main thread keep running.
+    Callback returning coroutine (async function) is started as task.
+    Pending callbacks kept in heap by aged priority,
+    each loop iteration runs batch of most urgent ones
+    """
+    config = inject.attr(MainThreadSettings)
+    # Waiting callback gains one priority level per that many seconds,
+    # so low priority work runs despite flood of urgent one
+    PRIORITY_AGING = 0.1
+    # Max time callbacks of batch run without letting other coroutines work
+    YIELD_INTERVAL = 0.005
+    # Callbacks run per loop iteration, newly sent ones join heap
+    # before next batch, so urgent call never waits for older batches
+    MAX_BATCH = 256
+
     def __init__(self):
-        self.callbacks: PriorityQueue[Callback] = PriorityQueue()
+        # Appended by any thread, taken by main thread only,
+        # so main thread never waits for senders
+        self._callbacks: deque[Callback] = deque()
+        # Taken callbacks by (rank, sequence), main thread only
+        self._heap: list[tuple[float, int, Callback]] = []
+        # Heap size after superseded callbacks were last removed from it
+        self._compacted_size = self.MAX_BATCH
+        self._sequence = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: set[asyncio.Task] = set()
         self._alive = True
+        # Latest pending callback per coalesce key (or call key),
+        # older ones are marked superseded and skipped once they reach the loop.
+        # Main thread only, senders take no lock, so they never
+        # hold each other (and main thread) while switching GIL
+        self._latest: dict[Hashable, Callback] = dict()
+        # Loop is woken up once until it runs out of callbacks,
+        # not once per callback
+        self._wakeup_sent = False
+        self._yielded_at = 0.0
+        # By coalesce key or by label for repeated calls
+        self.dropped_calls: Counter[Hashable] = Counter()
+        self.stats: defaultdict[str, CallStats] = defaultdict(CallStats)
+        self._stats_lock = threading.Lock()
+        self.max_pending = 0
 
     async def run_loop(self):
         if not is_main_thread():
             raise RuntimeError()
 
-        while self._alive:
+        self._wakeup = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._yielded_at = perf_counter()
+        try:
+            while self._alive:
+                await self._take_sent()
+                batch = self._take_batch()
+                if not batch:
+                    # Set by send_callback through the loop,
+                    # so wakeup can't happen between take and clear
+                    self._wakeup.clear()
+                    # Senders wake loop up again after flag reset,
+                    # callback sent before it is picked up here
+                    self._wakeup_sent = False
+                    if self._callbacks:
+                        continue
+                    await self._wakeup.wait()
+                    self._yielded_at = perf_counter()
+                    continue
+                await self._run_batch(batch)
+        finally:
+            # Nobody would run them, so let waiters go
+            heap, self._heap = self._heap, []
+            for _, _, callback in heap:
+                if callback.future is not None:
+                    callback.future.cancel()
+
+    async def _run_batch(self, batch: list[Callback]):
+        pending = iter(batch)
+        try:
+            for callback in pending:
+                if self._is_skipped(callback):
+                    continue
+                started = perf_counter()
+                try:
+                    with show_exceptions():
+                        self._execute(callback)
+                finally:
+                    self._record(callback, started)
+                if not self._alive:
+                    break
+                # Counted across batches, flood of them doesn't hold the loop
+                if perf_counter() - self._yielded_at > self.YIELD_INTERVAL:
+                    # Let other coroutines run between callbacks
+                    await asyncio.sleep(0)
+                    self._yielded_at = perf_counter()
+        finally:
+            # Closed or cancelled, so nobody would run them
+            for callback in pending:
+                if callback.future is not None:
+                    callback.future.cancel()
+
+    def _is_skipped(self, callback: Callback):
+        if self._is_stale(callback):
+            return True  # Its future cancelled once superseded
+        return self._is_expired(callback)
+
+    def _execute(self, callback: Callback):
+        if callback.future is not None:
+            self.run_into_future(callback.func, callback.future)
+            return
+        result = callback.func()
+        if asyncio.iscoroutine(result):
+            self.start_task(result)
+
+    def _record(self, callback: Callback, started: float):
+        finished = perf_counter()
+        run = finished - started
+        slow = run > self.config.slow_call_threshold
+        if slow:
+            print(f"Main thread call {callback.label} took {run:.3f} sec")
+        with self._stats_lock:
+            self.stats[callback.label].add(
+                started - callback.enqueued_at, run, slow
+            )
+
+    def run_into_future(self, func: Callable, future: Future):
+        """
+        Should be called from main thread,
+        result of func (or of task it started) is passed to future,
+        cancelled future cancels the task
+        """
+        if future.cancelled():
+            return
+        try:
+            result = func()
+        except BaseException as e:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(e)
+            return
+        if asyncio.iscoroutine(result):
+            self._chain_task(self.start_task(result), future)
+        elif future.set_running_or_notify_cancel():
+            future.set_result(result)
+
+    def _chain_task(self, task: asyncio.Task, future: Future):
+        loop = self._loop or asyncio.get_running_loop()
+
+        def on_future_done(_):
+            if future.cancelled() and not loop.is_closed():
+                loop.call_soon_threadsafe(task.cancel)
+
+        def on_task_done(_):
+            if task.cancelled():
+                future.cancel()
+            elif future.set_running_or_notify_cancel():
+                if task.exception() is not None:
+                    future.set_exception(task.exception())
+                else:
+                    future.set_result(task.result())
+
+        future.add_done_callback(on_future_done)
+        task.add_done_callback(on_task_done)
+
+    def start_task(self, coroutine) -> asyncio.Task:
+        """
+        Should be called from main thread
+        """
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._on_task_done)
+        return task
+
+    def _on_task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
             with show_exceptions():
-                callback = self.callbacks.get()
-                callback.func()
+                task.result()
+
+    async def _take_sent(self):
+        """
+        Moves callbacks sent so far to heap,
+        letting other coroutines run when there are many of them
+        """
+        callbacks, heap, latest = self._callbacks, self._heap, self._latest
+        sent = [callbacks.popleft() for _ in range(len(callbacks))]
+        taken = set()  # Slots of newer callbacks sent along
+        # Newest first, so flood of superseded ones doesn't grow heap
+        for callback in reversed(sent):
+            slot = self._get_slot(callback)
+            if slot in taken:
+                self._supersede(callback)
+                continue
+            if slot is not None:
+                taken.add(slot)
+                previous = latest.get(slot)
+                if previous is not None:
+                    self._supersede(previous)
+                latest[slot] = callback
+            heapq.heappush(heap, (callback.rank, callback.sequence, callback))
+            if perf_counter() - self._yielded_at > self.YIELD_INTERVAL:
+                await asyncio.sleep(0)
+                self._yielded_at = perf_counter()
+        if len(heap) > 2 * self._compacted_size:
+            await self._drop_superseded()
+
+    async def _drop_superseded(self):
+        """
+        Low priority callback superseded in heap waits there
+        until it ages, so such ones are removed once heap doubles
+        """
+        live = []
+        for entry in self._heap:
+            if not entry[2].superseded:
+                live.append(entry)
+            if perf_counter() - self._yielded_at > self.YIELD_INTERVAL:
+                await asyncio.sleep(0)
+                self._yielded_at = perf_counter()
+        heapq.heapify(live)
+        self._heap = live
+        self._compacted_size = max(len(live), self.MAX_BATCH)
+
+    def _supersede(self, callback: Callback):
+        callback.superseded = True
+        if callback.future is not None:
+            callback.future.cancel()
+        self.dropped_calls[callback.coalesce_key or callback.label] += 1
+
+    def _take_batch(self) -> list[Callback]:
+        heap = self._heap
+        return [heapq.heappop(heap)[2]
+                for _ in range(min(self.MAX_BATCH, len(heap)))]
 
     def send_callback(self, callback: Callback):
-        self.callbacks.put_nowait(callback)
+        if callback.label is None:
+            callback.label = get_label(callback.func)
+        callback.enqueued_at = perf_counter()
+        callback.rank = callback.priority + callback.enqueued_at / self.PRIORITY_AGING
+        callback.sequence = next(self._sequence)
+        self._callbacks.append(callback)
+        self.max_pending = max(self.max_pending, self.pending_count)
+        if self._wakeup_sent:
+            return  # Loop takes this callback with pending ones
+        self._wakeup_sent = True
+        self._wake_up()
+
+    @staticmethod
+    def _get_slot(callback: Callback) -> Optional[Hashable]:
+        if callback.coalesce_key is not None:
+            return callback.coalesce_key
+        return callback.call_key
+
+    def _wake_up(self):
+        # Callbacks sent before loop start
+        # are picked up on first iteration
+        if self._loop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            pass  # Loop is closed
+
+    def _is_stale(self, callback: Callback):
+        if callback.superseded:
+            return True
+        slot = self._get_slot(callback)
+        if slot is not None:
+            # Calls sent from now on aren't merged with this one
+            del self._latest[slot]
+        return False
+
+    @staticmethod
+    def _is_expired(callback: Callback):
+        if callback.deadline is None or monotonic() <= callback.deadline:
+            return False
+        future = callback.future
+        if future is not None and future.set_running_or_notify_cancel():
+            future.set_exception(TimeoutError(
+                "Main thread didn't start call in time"
+            ))
+        return True
+
+    @property
+    def pending_count(self):
+        return len(self._callbacks) + len(self._heap)
+
+    @property
+    def dropped_calls_total(self):
+        return sum(self.dropped_calls.values())
+
+    def get_diagnostics(self) -> str:
+        """
+        Text report of main thread calls,
+        times are in milliseconds
+        """
+        with self._stats_lock:
+            stats = sorted(self.stats.items(),
+                           key=lambda item: item[1].run_total,
+                           reverse=True)
+        lines = [
+            f"Pending calls: {self.pending_count} (max {self.max_pending})",
+            f"Running tasks: {len(self._tasks)}",
+            f"Dropped calls: {self.dropped_calls_total}",
+            f"Slow call threshold: {self.config.slow_call_threshold} sec",
+            "",
+            f"{'Calls':>8}{'Slow':>6}{'Wait avg':>10}{'Wait max':>10}"
+            f"{'Run avg':>10}{'Run max':>10}{'Run total':>11}  Function",
+        ]
+        for label, stat in stats:
+            lines.append(
+                f"{stat.calls:>8}{stat.slow_calls:>6}"
+                f"{stat.wait_total / stat.calls * 1000:>10.1f}"
+                f"{stat.wait_max * 1000:>10.1f}"
+                f"{stat.run_total / stat.calls * 1000:>10.1f}"
+                f"{stat.run_max * 1000:>10.1f}"
+                f"{stat.run_total * 1000:>11.1f}  {label}"
+            )
+        return "\n".join(lines)
 
     def close(self):
         self._alive = False
+        # Nobody would run them, so let waiters go
+        with suppress(IndexError):
+            while True:
+                callback = self._callbacks.popleft()
+                if callback.future is not None:
+                    callback.future.cancel()
+        self._wake_up()
+
+
+class MainThreadFunction:
+    """
+    Function decorated with execute_in_main_thread
+    """
+    def __init__(self,
+                 func: Callable,
+                 priority: int,
+                 coalesce: Optional[Hashable],
+                 timeout: Optional[float],
+                 dedupe: bool = False):
+        self.func = func
+        self.priority = priority
+        self.coalesce = coalesce
+        self.timeout = timeout
+        self.dedupe = dedupe
+        # Attribute name in class, when used as method
+        self._attribute: Optional[str] = None
+        update_wrapper(self, func)
+
+    def __set_name__(self, owner, name: str):
+        self._attribute = name
 
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        bound = copy(self)
+        bound.func = self.func.__get__(instance, owner)
+        if self._attribute is not None and hasattr(instance, '__dict__'):
+            # Found in instance before this descriptor next time,
+            # so each instance binds it once
+            instance.__dict__[self._attribute] = bound
+        return bound
 
-def execute_in_main_thread(priority: int = 10):
+    def __call__(self, *args, **kwargs):
+        if is_main_thread():
+            # Note that if thread is not main
+            # Then return value is None
+            result = self.func(*args, **kwargs)
+            if asyncio.iscoroutine(result):
+                # Task runs even if caller doesn't await it
+                return inject.instance(MainExecutor).start_task(result)
+            return result
+        self._send(args, kwargs)
+
+    def submit(self, *args, **kwargs) -> Future:
+        """
+        Same as call, but gives future with result or exception,
+        cancel it to skip pending call or stop the task
+        """
+        future = Future()
+        if is_main_thread():
+            inject.instance(MainExecutor).run_into_future(
+                lambda: self.func(*args, **kwargs), future
+            )
+        else:
+            self._send(args, kwargs, future)
+        return future
+
+    def _send(self, args, kwargs, future: Future = None):
+        func = self.func
+        call_key = None
+        if self.dedupe and future is None:
+            call_key = func, args, tuple(kwargs.items())
+            try:
+                hash(call_key)
+            except TypeError:
+                call_key = None
+        inject.instance(MainExecutor).send_callback(Callback(
+            partial(func, *args, **kwargs) if args or kwargs else func,
+            self.priority,
+            self.coalesce,
+            future,
+            None if self.timeout is None else monotonic() + self.timeout,
+            get_label(self),
+            call_key,
+        ))
+
+
+def execute_in_main_thread(priority: int = 10,
+                           coalesce: Hashable = None,
+                           timeout: float = None,
+                           dedupe: bool = False):
+    """
+    Run decorated function in main thread,
+    async function runs there as task.
+    Call from other thread is fire-and-forget,
+    use submit method of decorated function
+    to get concurrent.futures.Future instead.
+    :param priority: Lower value means sooner execution
+    :param coalesce: Key of latest-wins slot, when set
+    only the newest pending call with this key runs,
+    older ones are dropped (see MainExecutor.dropped_calls)
+    :param timeout: Call not started in that many seconds is dropped,
+    its future gets TimeoutError
+    :param dedupe: Pending fire-and-forget calls with same (hashable) args
+    run once, in place of the latest of them,
+    use for functions whose order of calls doesn't matter
+    """
     def _decorator(func):
-        def _wrapper(*args, **kwargs):
-            if is_main_thread():
-                # Note that if thread is not main
-                # Then return value is None
-                return func(*args, **kwargs)
-
-            inject.instance(MainExecutor).send_callback(Callback(
-                (lambda: func(*args, **kwargs))
-                if args or kwargs else func,
-                priority
-            ))
-        return _wrapper
+        return MainThreadFunction(func, priority, coalesce, timeout, dedupe)
     return _decorator
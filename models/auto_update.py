@@ -1,11 +1,15 @@
 from dataclasses import dataclass
 
+from commented_config import CommentsHolder
+
 
 @dataclass
 class ReleaseArchiveInfo:
     name: str
     size: int
     download_link: str
+    checksum_link: str = None  # SHA-256 published along with archive
+    manifest_link: str = None  # Hashes of archive members
 
 
 @dataclass
@@ -23,3 +27,31 @@ def get_version(version: str):
     """ str("1.0.0") -> tuple(1, 0, 0)
     """
     return tuple(int(i) for i in version.split("."))
+
+
+@dataclass
+class AutoUpdateSettings:
+    _comments_ = CommentsHolder()
+
+    check_for_updates: bool = True
+    _comments_.add("""
+       [{default!r}] Automatically checks for updates once per day
+       (Since program started)
+       Note, that you are still able to check updates manually,
+       Also there is no effect, if program starts from .py file
+    """, locals())
+
+    ask_before_update: bool = True
+    _comments_.add("""
+       [{default!r}] When new release found, ask user confirmation
+       before install it
+    """, locals())
+
+    check_delay: int = 24
+    _comments_.add("""
+       [{default!r} hours] Check for updates with delay specified
+       Starts from last check, restarts when delay value updated
+    """, locals())
+
+    def __post_init__(self):
+        self.check_delay = min(1000, abs(self.check_delay) or 1)
@@ -0,0 +1,31 @@
+from dataclasses import dataclass
+from enum import Enum, auto
+
+from commented_config import CommentsHolder
+
+
+class AppMode(Enum):
+    DISABLE = auto()
+    RULES = auto()
+    BRIGHTNESS = auto()
+
+
+@dataclass
+class WinTrackerSettings:
+    """
+    Specifies interaction with windows events
+    """
+    _comments_ = CommentsHolder()
+
+    show_events: bool = False
+    _comments_.add("""
+       [{default!r}] Display all window switch events
+    """, locals())
+
+    mode: AppMode = AppMode.RULES
+    _comments_.add(f"""
+        [{{default.name}}] How to process events: {' | '.join(e.name for e in AppMode)}
+        \t{AppMode.DISABLE.name} - Ignore all events
+        \t{AppMode.RULES.name} - Use rules to determine what to do
+        \t{AppMode.BRIGHTNESS.name} - Invert windows that are bright enough
+    """, locals())
@@ -1,11 +1,19 @@
-from copy import deepcopy
-from dataclasses import dataclass
-from typing import Callable, TypeVar, TextIO
-
-from active_window_checker import WinTrackerSettings
-from auto_update import AutoUpdateSettings
-from commented_config import CommentsHolder, CommentsWriter, get_comments_holder
+from collections import defaultdict
+from dataclasses import dataclass, fields, is_dataclass
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Callable, Iterable, Mapping, TypeVar, TextIO
+
+import dataclass_codecs
+from commented_config import COMMENT, CommentsHolder, CommentsWriter, get_line_key
+from file_poller import FileWatcherSettings
 from file_tracker import DataFileSyncer, Syncable
+from inversion_rules import RulesSettings
+from main_thread_loop import MainThreadSettings
+from models.auto_update import AutoUpdateSettings
+from models.win_tracker import WinTrackerSettings
+from window_brightness import BrightnessSettings
+from worker_pool import WorkerPoolSettings
 
 
 @dataclass
@@ -18,19 +26,42 @@ class UserSettings:
     auto_update: AutoUpdateSettings = AutoUpdateSettings()
     _comments_.add(None, locals())
 
+    brightness: BrightnessSettings = BrightnessSettings()
+    _comments_.add(None, locals(), True)
+
+    rules: RulesSettings = RulesSettings()
+    _comments_.add(None, locals())
+
+    file_watcher: FileWatcherSettings = FileWatcherSettings()
+    _comments_.add(None, locals(), True)
+
+    main_thread: MainThreadSettings = MainThreadSettings()
+    _comments_.add(None, locals(), True)
+
+    workers: WorkerPoolSettings = WorkerPoolSettings()
+    _comments_.add(None, locals(), True)
+
 
 T = TypeVar('T')
 OPTION_PATH = Callable[[UserSettings], T]
 OPTION_CHANGE_HANDLER = Callable[[T], None]
+FIELD_PATH = tuple[str, ...]
+# Read-only values of all settings leaves by their path
+SNAPSHOT = Mapping[FIELD_PATH, Any]
+HANDLER_ENTRY = tuple[int, OPTION_PATH, OPTION_CHANGE_HANDLER]
+_MISSING = object()
 
 
 class UserSettingsController(Syncable):
     def __init__(self):
         super().__init__(ConfigSyncer("settings", UserSettings()))
         self._syncer.on_file_reloaded = self.on_settings_changed
-        self._change_handlers: list[tuple[OPTION_PATH, OPTION_CHANGE_HANDLER]] = list()
-        self._old_data = deepcopy(self.settings)
-        self._loaded_data = deepcopy(self.settings)
+        # Handlers by path of settings they look at,
+        # paired with registration number to keep call order
+        self._change_handlers: defaultdict[FIELD_PATH, list[HANDLER_ENTRY]] = defaultdict(list)
+        self._handlers_count = 0
+        # Seen by handlers and saved to file
+        self._old_data = self._loaded_data = take_snapshot(self.settings)
 
     def setup(self):
         self._syncer.start()
@@ -41,35 +72,121 @@ class UserSettingsController(Syncable):
         return self._syncer.data
 
     def on_settings_changed(self):
-        self._loaded_data = deepcopy(self.settings)
-        for path, handler in self._change_handlers:
-            new_value = path(self.settings)
-            if path(self._old_data) != new_value:
-                handler(new_value)
-        self._old_data = deepcopy(self.settings)
+        snapshot = self._loaded_data = take_snapshot(self.settings)
+        changed_paths = get_changed_paths(self._old_data, snapshot)
+        self._old_data = snapshot
+        for path, handler in self._get_handlers(changed_paths):
+            handler(path(self.settings))
+
+    def _get_handlers(self, changed_paths: Iterable[FIELD_PATH]):
+        # Handler of path also notified about changes inside it
+        found = dict()
+        for changed_path in changed_paths:
+            for length in range(len(changed_path) + 1):
+                for number, path, handler in self._change_handlers.get(changed_path[:length], ()):
+                    found[number] = path, handler
+        return (found[number] for number in sorted(found))
 
     def save(self):
-        if self._loaded_data != self.settings:
+        snapshot = take_snapshot(self.settings)
+        if self._loaded_data != snapshot:
             super().save()
-            self._loaded_data = deepcopy(self.settings)
-            self._old_data = deepcopy(self.settings)
+            self._loaded_data = self._old_data = snapshot
 
     def add_option_change_handler(self,
                                   path: OPTION_PATH,
                                   handler: OPTION_CHANGE_HANDLER,
                                   initial=False):
-        self._change_handlers.append((path, handler))
+        """
+        :param path: Should access settings fields only,
+        e.g. lambda settings: settings.win_tracker.mode,
+        tuple of such fields is allowed,
+        otherwise handler called on any change
+        """
+        self._handlers_count += 1
+        for field_path in get_field_paths(path):
+            self._change_handlers[field_path].append(
+                (self._handlers_count, path, handler)
+            )
         if initial:
             handler(path(self._syncer.data))
 
 
+class _PathRecorder:
+    """
+    Stands for settings to find out fields option path uses
+    """
+    def __init__(self, path: FIELD_PATH = ()):
+        self._path_ = path
+
+    def __getattr__(self, name: str):
+        return _PathRecorder(self._path_ + (name,))
+
+
+def get_field_paths(path: OPTION_PATH) -> list[FIELD_PATH]:
+    try:
+        result = path(_PathRecorder())
+    except Exception:
+        return [()]
+    if isinstance(result, _PathRecorder):
+        return [result._path_]
+    if isinstance(result, tuple) and result and all(
+            isinstance(e, _PathRecorder) for e in result):
+        return [e._path_ for e in result]
+    return [()]
+
+
+def take_snapshot(settings: UserSettings) -> SNAPSHOT:
+    values = dict()
+    _add_leaves(values, (), settings)
+    return MappingProxyType(values)
+
+
+def _add_leaves(values: dict, path: FIELD_PATH, value):
+    if is_dataclass(value):
+        for name in _get_field_names(type(value)):
+            _add_leaves(values, path + (name,), getattr(value, name))
+    elif isinstance(value, (list, set)):
+        values[path] = tuple(value)
+    elif isinstance(value, dict):
+        values[path] = tuple(value.items())
+    else:
+        values[path] = value
+
+
+@lru_cache(maxsize=None)
+def _get_field_names(class_) -> tuple[str, ...]:
+    return tuple(f.name for f in fields(class_))
+
+
+def get_changed_paths(old: SNAPSHOT, new: SNAPSHOT) -> set[FIELD_PATH]:
+    changed = {
+        path for path, value in new.items()
+        if old.get(path, _MISSING) != value
+    }
+    changed.update(old.keys() - new.keys())
+    return changed
+
+
 class ConfigSyncer(DataFileSyncer[UserSettings]):
     JSON_DUMPER_KWARGS = dict(
         strip_privates=True,
         strip_properties=True
     )
 
-    def _dump(self, stream: TextIO):
-        writer = CommentsWriter()
-        super()._dump(writer.input_stream)
-        writer.dump(stream, get_comments_holder(self._class))
+    def snapshot(self) -> dict:
+        # Plain data made once, instead of deep copy
+        return dataclass_codecs.dump(self.data, **self.JSON_DUMPER_KWARGS)
+
+    def _dump(self, stream: TextIO, data: UserSettings):
+        # Text of invalid options kept commented out,
+        # so user can fix it instead of typing again
+        rejected = {
+            get_line_key(path): (
+                f"{COMMENT} Invalid, default used: {message}\n",
+                *(f"{COMMENT} {line}\n" for line in text.splitlines())
+            )
+            for path, (text, message) in self.validation.rejected.items()
+        }
+        with CommentsWriter().stream_to(stream, self._class, rejected) as output:
+            super()._dump(output, data)
@@ -0,0 +1,97 @@
+import hashlib
+import io
+import os
+import zipfile
+
+import pytest
+
+from archive_stream import StreamError, ZipStreamExtractor
+from delta_update import DeltaError
+
+FILES = {
+    'app.py': b'print("hello")\n' * 100,
+    'lib/data.bin': os.urandom(10_000),
+    'lib/empty.txt': b'',
+}
+
+
+class Unseekable(io.RawIOBase):
+    """
+    Output zipfile can't go back to, so sizes written after data
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += b
+        return len(b)
+
+
+def make_archive(files=FILES, compression=zipfile.ZIP_DEFLATED, seekable=True) -> bytes:
+    output = io.BytesIO() if seekable else Unseekable()
+    with zipfile.ZipFile(output, 'w', compression) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return output.getvalue() if seekable else bytes(output.data)
+
+
+def extract(destination, archive: bytes, chunk_size=7, manifest=None) -> ZipStreamExtractor:
+    with ZipStreamExtractor(str(destination), manifest) as extractor:
+        for offset in range(0, len(archive), chunk_size):
+            extractor.write(archive[offset:offset + chunk_size])
+        extractor.finish()
+    return extractor
+
+
+def assert_extracted(destination, files=FILES):
+    for name, content in files.items():
+        assert (destination / name).read_bytes() == content
+
+
+@pytest.mark.parametrize('compression', [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+def test_members_extracted_from_chunks(tmp_path, compression):
+    extractor = extract(tmp_path, make_archive(compression=compression))
+    assert extractor.extracted == list(FILES)
+    assert_extracted(tmp_path)
+
+
+def test_sizes_after_data(tmp_path):
+    extract(tmp_path, make_archive(seekable=False), chunk_size=1000)
+    assert_extracted(tmp_path)
+
+
+def test_manifest_checksum_checked(tmp_path):
+    manifest = {
+        name: dict(size=len(content), sha256=hashlib.sha256(content).hexdigest())
+        for name, content in FILES.items()
+    }
+    extract(tmp_path, make_archive(), manifest=manifest)
+
+    manifest['lib/data.bin']['sha256'] = '0' * 64
+    with pytest.raises(StreamError, match="Checksum mismatch: lib/data.bin"):
+        extract(tmp_path, make_archive(), manifest=manifest)
+
+
+def test_corrupted_member_rejected(tmp_path):
+    archive = bytearray(make_archive(compression=zipfile.ZIP_STORED))
+    offset = archive.index(FILES['app.py'])
+    archive[offset] ^= 0xFF
+    with pytest.raises(StreamError, match="CRC mismatch: app.py"):
+        extract(tmp_path, bytes(archive))
+
+
+def test_truncated_archive_rejected(tmp_path):
+    archive = make_archive()
+    with pytest.raises(StreamError, match="ended before"):
+        extract(tmp_path, archive[:len(archive) // 2])
+
+
+def test_member_outside_destination_rejected(tmp_path):
+    archive = make_archive({'../outside.py': b'data'})
+    with pytest.raises(DeltaError):
+        extract(tmp_path / 'update', archive)
+    assert not (tmp_path / 'outside.py').exists()
@@ -0,0 +1,77 @@
+from dataclasses import dataclass, field
+
+import inject
+import pytest
+
+from file_tracker import DataFileSyncer
+
+try:
+    from settings import ConfigSyncer
+except ValueError:  # Instances as dataclass defaults, rejected since Python 3.11
+    ConfigSyncer = None
+
+
+@dataclass
+class Item:
+    value: int = 0
+    name: str = ''
+
+
+@dataclass
+class Inner:
+    speed: float = 1.0
+
+
+@dataclass
+class Options:
+    inner: Inner = field(default_factory=Inner)
+    count: int = 3
+
+
+@pytest.fixture(autouse=True)
+def injector():
+    inject.clear_and_configure(lambda binder: None)
+    yield
+    inject.clear()
+
+
+def write(path, text: str):
+    path.write_text(text, encoding='utf-8')
+
+
+def test_invalid_item_quarantined_and_saved_back(tmp_path):
+    write(tmp_path / 'items.yaml',
+          "good:\n  value: 1\nbad:\n  value: [1, 2]\n  name: x\n")
+    syncer = DataFileSyncer(str(tmp_path / 'items'), dict(), dict[str, Item])
+    syncer.load_file()
+
+    assert syncer.data == {'good': Item(1)}
+    assert syncer.validation.quarantine == {'bad': {'value': [1, 2], 'name': 'x'}}
+    [error] = syncer.validation.errors
+    assert (error.line, error.column, error.path) == (4, 10, 'bad.value')
+
+    syncer.save_file()
+    syncer.load_file()
+    assert syncer.data == {'good': Item(1)}
+    assert syncer.validation.quarantine == {'bad': {'value': [1, 2], 'name': 'x'}}
+
+
+@pytest.mark.skipif(ConfigSyncer is None, reason="settings need Python 3.10")
+def test_rejected_option_text_kept_commented_out(tmp_path):
+    path = tmp_path / 'options.yaml'
+    write(path, "inner:\n  speed: fast\ncount: 5\n")
+    syncer = ConfigSyncer(str(tmp_path / 'options'), Options())
+    syncer.load_file()
+
+    assert syncer.data == Options(Inner(1.0), 5)
+    assert syncer.validation.rejected == {
+        ('inner', 'speed'): ('speed: fast', "float expected, got 'fast'")
+    }
+
+    syncer.save_file()
+    text = path.read_text(encoding='utf-8')
+    assert "# Invalid, default used: float expected, got 'fast'\n# speed: fast\n" in text
+
+    syncer.load_file()
+    assert syncer.data == Options(Inner(1.0), 5)
+    assert not syncer.validation.errors
@@ -0,0 +1,43 @@
+import hashlib
+import os
+
+import pytest
+
+from delta_update import DeltaError, get_changed, get_local_path, update_by_delta
+
+
+def test_member_path_inside_directory(tmp_path):
+    assert get_local_path(str(tmp_path), 'lib/app.py') == \
+        os.path.join(str(tmp_path), 'lib', 'app.py')
+
+
+@pytest.mark.parametrize('name', [
+    '../app.py',
+    'lib/../../app.py',
+    '/etc/app.py',
+])
+def test_member_path_outside_directory_rejected(tmp_path, name):
+    with pytest.raises(DeltaError, match="Unsafe member name"):
+        get_local_path(str(tmp_path), name)
+
+
+def test_unsafe_manifest_rejected_before_download(tmp_path):
+    manifest = {'../outside.py': dict(size=1, sha256='0' * 64)}
+    update_path = tmp_path / 'update'
+    with pytest.raises(DeltaError):
+        # No server, so nothing is requested
+        update_by_delta('http://127.0.0.1:9/release.zip', 1, manifest,
+                        str(tmp_path / 'app'), str(update_path))
+    assert not update_path.exists()
+    assert not (tmp_path / 'outside.py').exists()
+
+
+def test_changed_files_found_by_size_and_hash(tmp_path):
+    (tmp_path / 'same.txt').write_bytes(b'same')
+    (tmp_path / 'edited.txt').write_bytes(b'edit')
+    manifest = {
+        'same.txt': dict(size=4, sha256=hashlib.sha256(b'same').hexdigest()),
+        'edited.txt': dict(size=4, sha256='0' * 64),
+        'missing.txt': dict(size=4, sha256='0' * 64),
+    }
+    assert get_changed(manifest, str(tmp_path)) == {'edited.txt', 'missing.txt'}
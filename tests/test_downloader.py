@@ -0,0 +1,77 @@
+import hashlib
+import json
+import os
+import threading
+
+import pytest
+
+from benchmarks.downloader import ArchiveServer, QuickRetryDownload
+from downloader import Download, DownloadError
+
+SIZE = 256 * 1024
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = ArchiveServer(os.urandom(SIZE))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_download(server: ArchiveServer, tmp_path, sha256: str = None) -> Download:
+    if sha256 is None:
+        sha256 = hashlib.sha256(server.content).hexdigest()
+    return QuickRetryDownload(server.url, str(tmp_path / 'release.zip'),
+                              sha256, len(server.content))
+
+
+def write_part(download: Download, data: bytes, url: str, validator: str = None):
+    with open(download.part_path, 'wb') as f:
+        f.write(data)
+    if url is not None:
+        with open(download.source_path, 'w', encoding='utf-8') as f:
+            json.dump({'url': url, 'validator': validator}, f)
+
+
+def read(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_part_resumed_by_range(server, tmp_path):
+    download = make_download(server, tmp_path)
+    write_part(download, server.content[:SIZE // 2], server.url, server.etag)
+    assert read(download.run()) == server.content
+    assert download.stats.resumed_from == SIZE // 2
+    assert download.stats.transferred == SIZE // 2
+    assert not os.path.exists(download.part_path)
+    assert not os.path.exists(download.source_path)
+
+
+def test_part_of_changed_file_started_over(server, tmp_path):
+    download = make_download(server, tmp_path)
+    # If-Range with old validator, so server sends whole file
+    write_part(download, os.urandom(SIZE // 2), server.url, '"old"')
+    assert read(download.run()) == server.content
+    assert download.stats.resumed_from == 0
+    assert download.stats.transferred == SIZE
+
+
+@pytest.mark.parametrize('url', [None, 'http://127.0.0.1/old_release.zip'])
+def test_part_of_other_download_discarded(server, tmp_path, url):
+    download = make_download(server, tmp_path)
+    write_part(download, os.urandom(SIZE // 2), url, server.etag)
+    assert read(download.run()) == server.content
+    assert download.stats.resumed_from == 0
+    assert download.stats.transferred == SIZE
+
+
+def test_checksum_mismatch_discards_part(server, tmp_path):
+    download = make_download(server, tmp_path, '0' * 64)
+    with pytest.raises(DownloadError, match="Checksum mismatch"):
+        download.run()
+    assert not os.path.exists(download.path)
+    assert not os.path.exists(download.part_path)
+    assert not os.path.exists(download.source_path)
@@ -0,0 +1,69 @@
+from dataclasses import dataclass
+
+import inject
+import pytest
+
+from file_tracker import DataFileSyncer, WriteBehindSaver
+from worker_pool import WorkerPool
+
+
+@dataclass
+class Data:
+    value: int = 0
+
+
+@pytest.fixture
+def saver():
+    # Long delay, so test flushes saves itself
+    saver = WriteBehindSaver(delay=60)
+    workers = WorkerPool()
+    inject.clear_and_configure(lambda binder: binder
+                               .bind(WriteBehindSaver, saver)
+                               .bind(WorkerPool, workers))
+    yield saver
+    workers.shutdown()
+    inject.clear()
+
+
+def make_syncer(tmp_path, value: int) -> DataFileSyncer[Data]:
+    syncer = DataFileSyncer(str(tmp_path / 'data'), Data(value))
+    syncer.save_file()
+    return syncer
+
+
+def read_value(syncer: DataFileSyncer) -> str:
+    with open(syncer.filename, encoding='utf-8') as f:
+        return f.read().strip()
+
+
+def test_write_behind_saves_latest_data(tmp_path, saver):
+    syncer = make_syncer(tmp_path, 1)
+    syncer.data.value = 2
+    syncer.save_file_later()
+    syncer.data.value = 3
+    syncer.save_file_later()
+    saver.flush()
+    assert read_value(syncer) == 'value: 3'
+
+
+def test_save_queued_before_load_is_dropped(tmp_path, saver):
+    syncer = make_syncer(tmp_path, 1)
+    syncer.data.value = 2
+    syncer.save_file_later()
+    # External edit loaded before queued save is written
+    with open(syncer.filename, 'w', encoding='utf-8') as f:
+        f.write('value: 5\n')
+    syncer.load_file()
+    saver.flush()
+    assert syncer.data == Data(5)
+    assert read_value(syncer) == 'value: 5'
+
+
+def test_save_queued_after_load_is_written(tmp_path, saver):
+    syncer = make_syncer(tmp_path, 1)
+    syncer.load_file()
+    syncer.data.value = 7
+    syncer.save_file_later()
+    saver.flush()
+    assert read_value(syncer) == 'value: 7'
+    assert not list(tmp_path.glob('*.tmp'))
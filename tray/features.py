@@ -14,6 +14,7 @@ import win32security
 import winerror
 
 import _meta
+from utils import open_atomic
 
 _shell = ctypes.windll.shell32
 
@@ -69,7 +70,7 @@ class StartupTaskGenerator:
             date_now=self.date_now,
             description=self.description
         )
-        with open(self.result_path, 'w', encoding=encoding) as f:
+        with open_atomic(self.result_path, encoding=encoding) as f:
             f.write(template_content)
 
     @property
@@ -12,10 +12,14 @@ from auto_update import AutoUpdater
 from color_filter import ColorFiltersListController
 from interaction import InteractionManager
 from inversion_rules import InversionRulesController
+from main_thread_loop import MainExecutor
 from settings import UserSettingsController, OPTION_PATH, OPTION_CHANGE_HANDLER, T
 from tray.features import has_admin_rights, Console, SystemStartupHandler, start_with_admin_rights
 from tray.utils import ref, make_toggle, make_radiobutton
-from utils import explore, app_abs_path, show_exceptions
+from utils import explore, app_abs_path, open_atomic, show_exceptions
+from worker_pool import WorkerPool
+
+DIAGNOSTICS_FILE = "diagnostics.txt"
 
 
 class Tray:
@@ -27,6 +31,8 @@ class Tray:
     close_manager = inject.attr(AppCloseManager)
     console = inject.attr(Console)
     startup_handler = inject.attr(SystemStartupHandler)
+    main_executor = inject.attr(MainExecutor)
+    workers = inject.attr(WorkerPool)
 
     def __init__(self):
         self.tray = None
@@ -111,6 +117,8 @@ class Tray:
                              _open(app_abs_path(
                                  self.color_filters_holder.filename
                              ))),
+                    MenuItem(ref('Diagnostics'),
+                             callback(self.dump_diagnostics)),
                 )
             ),
             MenuItem(
@@ -131,7 +139,10 @@ class Tray:
                      callback(im.choose_window_to_remove_rules)),
             Menu.SEPARATOR,
             MenuItem(f'Check for {ref("updates")}',
-                     callback(self.updater.check_for_updates)),
+                     callback(self.updater.check_now)),
+            MenuItem('Roll back update',
+                     callback(self.updater.rollback),
+                     visible=lambda item: self.updater.has_backup()),
             Menu.SEPARATOR,
             MenuItem(ref('Exit'),
                      callback(self.close_manager.close)),
@@ -158,11 +169,21 @@ class Tray:
     @make_radiobutton({
         AppMode.DISABLE: ref("Ignore All"),
         AppMode.RULES: ref("According with rules"),
+        AppMode.BRIGHTNESS: ref("By window brightness"),
     }, AppMode.RULES)
     def change_mode(self, value: AppMode):
         self.settings_controller.settings.win_tracker.mode = value
         self.settings_controller.save()
 
+    def dump_diagnostics(self):
+        # Made from tray thread, so works even if main thread stuck
+        path = app_abs_path(DIAGNOSTICS_FILE)
+        with open_atomic(path, encoding='utf-8') as f:
+            f.write(self.main_executor.get_diagnostics())
+            f.write("\n\n")
+            f.write(self.workers.get_utilisation())
+        explore(path)
+
     def restart_with_admin_rights(self):
         if start_with_admin_rights(self.console.visible):
             self.close_manager.close()
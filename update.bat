@@ -6,7 +6,7 @@ echo Final updating stage started
 cd ..
 echo Current version located in %1
 echo Updated one is in %2
-echo Backup file: "%1_old.zip"
+echo Backup: "%1_old"
 timeout /t 5 /nobreak
 rmdir /S /Q %1
 rename %2 %1
@@ -7,7 +7,7 @@ from traceback import print_exc
 
 from _meta import APP_DIR, __developer_mode__
 
-FILEBROWSER_PATH = os.path.join(os.getenv('WINDIR'), 'explorer.exe')
+FILEBROWSER_PATH = os.path.join(os.getenv('WINDIR', ''), 'explorer.exe')
 
 
 class MetaInitHook(type):
@@ -154,6 +154,26 @@ def app_abs_path(path: str):
     return os.path.join(APP_DIR, os.path.normpath(path))
 
 
+@contextlib.contextmanager
+def open_atomic(path: str, mode='w', **kwargs):
+    """
+    Writes to temporary file, which replaces path once closed,
+    so readers never see half-written file and hardlinks
+    of old file (e.g. in backup) keep old content.
+    Temporary name is unique per thread,
+    so concurrent writers don't clash, the last one wins
+    """
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(temp_path, mode, **kwargs) as f:
+            yield f
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+
 @contextlib.contextmanager
 def show_exceptions():
     try:
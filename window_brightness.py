@@ -0,0 +1,236 @@
+"""
+Decides whether window is bright enough to be inverted,
+window frame is captured, downsampled by striding
+and luminance histogram is built over samples left
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import TYPE_CHECKING, Optional
+
+import inject
+import numpy as np
+
+from _meta import IndirectDependency
+from commented_config import CommentsHolder
+from utils import set_between
+
+if TYPE_CHECKING:
+    from active_window_checker import WindowInfo
+
+# Rec. 709 luma coefficients scaled to 256
+LUMA_WEIGHTS = (54, 183, 19)
+HISTOGRAM_BINS = 32
+_BIN_SHIFT = 3  # 256 levels >> 3 == 32 bins
+
+
+@dataclass
+class BrightnessSettings:
+    """
+    Used by BRIGHTNESS mode, window is bright
+    when share of light pixels in it is high enough
+    """
+    _comments_ = CommentsHolder()
+
+    light_level: float = 0.7
+    _comments_.add("""
+       [{default!r}] Pixel luminance (0.0 - 1.0) treated as light
+    """, locals())
+
+    invert_threshold: float = 0.6
+    _comments_.add("""
+       [{default!r}] Share of light pixels (0.0 - 1.0)
+       required to apply color filter
+    """, locals())
+
+    restore_threshold: float = 0.4
+    _comments_.add("""
+       [{default!r}] Color filter removed when share of light pixels
+       drops below this value,
+       values in between keep previous decision for this window
+    """, locals())
+
+    sample_size: int = 128
+    _comments_.add("""
+       [{default!r}] Max samples taken per side of window,
+       the bigger value the slower and more precise check is
+    """, locals())
+
+    def __post_init__(self):
+        self.light_level = set_between(0.0, 1.0, self.light_level)
+        self.invert_threshold = set_between(0.0, 1.0, self.invert_threshold)
+        self.restore_threshold = set_between(0.0, self.invert_threshold,
+                                             self.restore_threshold)
+        self.sample_size = set_between(8, 1024, self.sample_size)
+
+
+class FrameCapture(ABC):
+    """
+    Source of window pixels,
+    frame is (height, width, 3+) RGB array of uint8
+    """
+    @abstractmethod
+    def capture(self, hwnd: int) -> Optional[np.ndarray]:
+        ...
+
+
+class GdiFrameCapture(FrameCapture):
+    """
+    Copies window area from screen, already scaled down,
+    so cost doesn't depend on window size
+    """
+
+    def __init__(self, max_side=256):
+        self.max_side = max_side
+
+    def capture(self, hwnd: int) -> Optional[np.ndarray]:
+        import win32con
+        import win32gui
+        import win32ui
+
+        left, top, right, bottom = win32gui.GetWindowRect(hwnd)
+        width, height = right - left, bottom - top
+        if width <= 0 or height <= 0:
+            return
+
+        scale = min(1.0, self.max_side / max(width, height))
+        size = max(1, int(width * scale)), max(1, int(height * scale))
+
+        screen_dc = win32gui.GetWindowDC(0)
+        source_dc = win32ui.CreateDCFromHandle(screen_dc)
+        memory_dc = source_dc.CreateCompatibleDC()
+        bitmap = win32ui.CreateBitmap()
+        try:
+            bitmap.CreateCompatibleBitmap(source_dc, *size)
+            memory_dc.SelectObject(bitmap)
+            win32gui.SetStretchBltMode(memory_dc.GetSafeHdc(),
+                                       win32con.COLORONCOLOR)
+            memory_dc.StretchBlt((0, 0), size, source_dc,
+                                 (left, top), (width, height),
+                                 win32con.SRCCOPY)
+            bits = bitmap.GetBitmapBits(True)
+        finally:
+            win32gui.DeleteObject(bitmap.GetHandle())
+            memory_dc.DeleteDC()
+            source_dc.DeleteDC()
+            win32gui.ReleaseDC(0, screen_dc)
+
+        # BGRA -> RGB
+        frame = np.frombuffer(bits, np.uint8)
+        return frame.reshape(size[1], size[0], 4)[..., 2::-1]
+
+
+class SyntheticFrameCapture(FrameCapture):
+    """
+    Returns prepared frames, use it
+    to check brightness detection without screen
+    """
+
+    def __init__(self, frames: dict[int, np.ndarray] = None,
+                 default: np.ndarray = None):
+        self.frames = frames or dict()
+        self.default = default
+        self.captures_count = 0
+
+    def capture(self, hwnd: int) -> Optional[np.ndarray]:
+        self.captures_count += 1
+        return self.frames.get(hwnd, self.default)
+
+    @staticmethod
+    def solid_frame(width: int, height: int, luminance: float):
+        level = round(set_between(0.0, 1.0, luminance) * 255)
+        return np.full((height, width, 3), level, np.uint8)
+
+
+def luminance_histogram(frame: np.ndarray, sample_size=128) -> np.ndarray:
+    """
+    Histogram of at most sample_size x sample_size pixels
+    taken with fixed stride, so cost is bounded for any frame size
+    """
+    height, width = frame.shape[:2]
+    step_y = max(1, -(-height // sample_size))
+    step_x = max(1, -(-width // sample_size))
+    samples = frame[::step_y, ::step_x, :3].astype(np.uint16)
+    r, g, b = LUMA_WEIGHTS
+    luma = (samples[..., 0] * r
+            + samples[..., 1] * g
+            + samples[..., 2] * b) >> 8
+    return np.bincount((luma >> _BIN_SHIFT).ravel(),
+                       minlength=HISTOGRAM_BINS)
+
+
+def light_share(histogram: np.ndarray, light_level: float) -> float:
+    total = histogram.sum()
+    if not total:
+        return 0.0
+    first_light_bin = min(HISTOGRAM_BINS - 1,
+                          int(light_level * HISTOGRAM_BINS))
+    return float(histogram[first_light_bin:].sum() / total)
+
+
+class BrightnessDetector:
+    """
+    Measures windows brightness,
+    result is cached per window until its title
+    or brightness settings changed
+    """
+    config = inject.attr(BrightnessSettings)
+    frame_capture = inject.attr(FrameCapture)
+
+    CACHE_SIZE = 256
+
+    def __init__(self):
+        # hwnd -> (title, is bright)
+        self._cache: OrderedDict[int, tuple[str, bool]] = OrderedDict()
+        # Used by window lookup workers and by rules change handler
+        self._cache_lock = Lock()
+
+    @inject.params(settings_controller=IndirectDependency.SETTINGS_CONTROLLER)
+    def setup(self, settings_controller):
+        settings_controller.add_option_change_handler(
+            lambda settings: settings.brightness,
+            lambda _: self.forget()
+        )
+
+    def get_filter(self, info: 'WindowInfo') -> Optional[tuple[str, float]]:
+        bright = self.is_bright(info)
+        if bright is None:
+            return
+        return ('inversion', 1.0) if bright else ('no effect', 1.0)
+
+    def is_bright(self, info: 'WindowInfo') -> Optional[bool]:
+        with self._cache_lock:
+            cached = self._cache.get(info.hwnd)
+            if cached is not None:
+                self._cache.move_to_end(info.hwnd)
+                if cached[0] == info.title:
+                    return cached[1]
+
+        frame = self.frame_capture.capture(info.hwnd)
+        if frame is None or not frame.size:
+            return None if cached is None else cached[1]
+
+        was_bright = cached is not None and cached[1]
+        bright = self.check_frame(frame, was_bright)
+        with self._cache_lock:
+            self._cache[info.hwnd] = info.title, bright
+            if len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return bright
+
+    def check_frame(self, frame: np.ndarray, was_bright=False) -> bool:
+        config = self.config
+        share = light_share(
+            luminance_histogram(frame, config.sample_size),
+            config.light_level
+        )
+        # Hysteresis: keep previous decision
+        # while share is between thresholds
+        if was_bright:
+            return share >= config.restore_threshold
+        return share >= config.invert_threshold
+
+    def forget(self):
+        with self._cache_lock:
+            self._cache.clear()
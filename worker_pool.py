@@ -0,0 +1,219 @@
+import heapq
+import itertools
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import suppress
+from dataclasses import dataclass, field
+from threading import Condition, Lock, Thread
+from time import monotonic, perf_counter
+from traceback import print_exception
+from typing import Callable, Optional
+
+import inject
+
+from commented_config import CommentsHolder
+from utils import set_between
+
+
+@dataclass
+class WorkerPoolSettings:
+    """
+    Blocking work (saves, window lookups, updates)
+    done by fixed set of threads
+    """
+    _comments_ = CommentsHolder()
+
+    max_workers: int = 4
+    _comments_.add("""
+       [{default!r}] Threads for background work,
+       lower it on slow machines, applied after restart
+    """, locals())
+
+    def __post_init__(self):
+        self.max_workers = set_between(1, 32, self.max_workers)
+
+
+@dataclass
+class KindStats:
+    tasks: int = 0
+    running: int = 0
+    peak_running: int = 0
+    wait_total: float = 0.0
+    busy_total: float = 0.0
+
+
+@dataclass(order=True)
+class DelayedCall:
+    due: float
+    sequence: int
+    kind: str = field(compare=False)
+    func: Callable = field(compare=False)
+    cancelled: bool = field(default=False, compare=False)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class WorkerPool:
+    """
+    Shared pool for blocking work of all subsystems,
+    tasks labelled by kind for utilisation report
+    """
+    config = inject.attr(WorkerPoolSettings)
+
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._max_workers = 0
+        self._lock = Lock()
+        self._stats: defaultdict[str, KindStats] = defaultdict(KindStats)
+        self._started_at = perf_counter()
+        # Single thread starts all delayed calls
+        self._timers: list[DelayedCall] = []  # heap
+        self._timers_condition = Condition()
+        self._timer_thread: Optional[Thread] = None
+        self._sequence = itertools.count()
+        self._closed = False
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Worker pool is shut down")
+            if self._executor is None:
+                self._max_workers = self.config.max_workers
+                self._executor = ThreadPoolExecutor(
+                    self._max_workers,
+                    thread_name_prefix="Worker"
+                )
+            return self._executor
+
+    def _track(self, kind: str, func: Callable, *args, **kwargs) -> Callable:
+        queued_at = perf_counter()
+
+        def run():
+            started = perf_counter()
+            with self._lock:
+                stats = self._stats[kind]
+                stats.tasks += 1
+                stats.running += 1
+                stats.peak_running = max(stats.peak_running, stats.running)
+                stats.wait_total += started - queued_at
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    stats.running -= 1
+                    stats.busy_total += perf_counter() - started
+
+        return run
+
+    def submit(self, kind: str, func: Callable, *args, **kwargs) -> Future:
+        """
+        After shutdown gives cancelled future,
+        so threads still running on app exit may call it
+        """
+        with suppress(RuntimeError):  # Pool is shut down
+            return self._get_executor().submit(self._track(kind, func, *args, **kwargs))
+        return _cancelled_future()
+
+    def submit_dedicated(self, kind: str, func: Callable, *args, **kwargs) -> Future:
+        """
+        Runs long work (e.g. update download) by its own thread,
+        so it doesn't hold any of shared workers for minutes,
+        shown in utilisation report, but not limited by pool size
+        """
+        with self._lock:
+            if self._closed:
+                return _cancelled_future()
+        future = Future()
+        future.set_running_or_notify_cancel()
+        run = self._track(kind, func, *args, **kwargs)
+
+        def target():
+            try:
+                result = run()
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+        Thread(name=f"Worker ({kind})", target=target, daemon=True).start()
+        return future
+
+    def submit_later(self, delay: float, kind: str, func: Callable) -> DelayedCall:
+        call = DelayedCall(monotonic() + delay, next(self._sequence), kind, func)
+        with self._timers_condition:
+            heapq.heappush(self._timers, call)
+            if self._timer_thread is None:
+                self._timer_thread = Thread(
+                    name="Worker Pool Timer",
+                    target=self._run_timers,
+                    daemon=True
+                )
+                self._timer_thread.start()
+            self._timers_condition.notify()
+        return call
+
+    def _run_timers(self):
+        with self._timers_condition:
+            while True:
+                if not self._timers:
+                    self._timers_condition.wait()
+                    continue
+                delay = self._timers[0].due - monotonic()
+                if delay > 0:
+                    self._timers_condition.wait(delay)
+                    continue
+                call = heapq.heappop(self._timers)
+                if not call.cancelled:
+                    self.submit(call.kind, call.func).add_done_callback(
+                        self._report_failure
+                    )
+
+    @staticmethod
+    def _report_failure(future: Future):
+        # Nobody waits for result of delayed call
+        if not future.cancelled() and future.exception() is not None:
+            error = future.exception()
+            print_exception(type(error), error, error.__traceback__)
+
+    def get_utilisation(self) -> str:
+        """
+        Text report, utilisation is share of pool capacity
+        used by tasks of kind since start
+        """
+        with self._lock:
+            stats = sorted(self._stats.items())
+            workers = self._max_workers or self.config.max_workers
+        capacity = (perf_counter() - self._started_at) * workers
+        lines = [
+            f"Workers: {workers}",
+            f"Delayed calls: {len(self._timers)}",
+            "",
+            f"{'Tasks':>8}{'Running':>9}{'Peak':>6}{'Wait avg':>10}"
+            f"{'Busy, s':>10}{'Usage':>8}  Kind",
+        ]
+        for kind, stat in stats:
+            wait = stat.wait_total / stat.tasks * 1000 if stat.tasks else 0.0
+            lines.append(
+                f"{stat.tasks:>8}{stat.running:>9}{stat.peak_running:>6}"
+                f"{wait:>10.1f}{stat.busy_total:>10.2f}"
+                f"{stat.busy_total / capacity:>8.1%}  {kind}"
+            )
+        return "\n".join(lines)
+
+    def shutdown(self):
+        """
+        Drops queued tasks, running ones are not waited
+        """
+        with self._timers_condition:
+            self._timers.clear()
+        with self._lock:
+            self._closed = True
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _cancelled_future() -> Future:
+    future = Future()
+    future.cancel()
+    return future